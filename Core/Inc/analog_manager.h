@@ -46,6 +46,34 @@ int get_voltage_feedback_mv_averaged(uint16_t *voltage_mv, uint8_t num_samples,
 int get_current_feedback_ma(uint16_t *current_ma);
 int get_current_feedback_ma_averaged(uint16_t *current_ma, uint8_t num_samples, uint32_t sample_delay_ms);
 
+/* Number of timestamped current samples kept by the background sampler */
+#define CURRENT_SAMPLE_BUFFER_SIZE 128
+
+typedef struct
+{
+    uint32_t time_ms;     /* Milliseconds since sampling was started */
+    uint16_t current_ma;
+} current_sample_t;
+
+/**
+ * @brief Start sampling the current feedback in the background
+ * @param interval_ms Time between samples in milliseconds (at least 1)
+ * @return 0 on success, -1 on invalid parameters or if the sampler is not running
+ *
+ * Any samples from an earlier run are discarded. Once the buffer is full the
+ * oldest samples are overwritten.
+ */
+int current_sampling_start(uint32_t interval_ms);
+
+/**
+ * @brief Stop background current sampling and copy out the collected samples
+ * @param samples Buffer receiving the samples, oldest first
+ * @param max_samples Size of the samples buffer
+ * @param dropped Pointer to store the number of samples overwritten (may be NULL)
+ * @return Number of samples copied
+ */
+uint16_t current_sampling_stop(current_sample_t *samples, uint16_t max_samples, uint32_t *dropped);
+
 #ifdef __cplusplus
 }
 #endif
@@ -13,6 +13,7 @@ bool CommandStation_LoadCustomPacket(const uint8_t* bytes, uint8_t length, bool
 void CommandStation_TriggerTransmit(uint32_t delay_ms);
 bool CommandStation_IsCustomPacketQueueFull(void);
 uint8_t CommandStation_GetCustomPacketQueueCount(void);
+bool CommandStation_IsIdle(void);  // Returns true if running and no triggered transmission is pending
 
 // RAM-only override parameter getters/setters
 void CommandStation_SetZerobitOverrideMask(uint64_t mask);
@@ -1,6 +1,7 @@
 #pragma once
 
 #include <string>
+#include <vector>
 #include <functional>
 #include <cstring>
 
@@ -37,11 +38,16 @@ public:
     // Handle a raw request string and return a serialized response
     std::string handle(const std::string& request_str);
 
+    // Handle a MessagePack request and return a MessagePack response
+    std::vector<uint8_t> handle_msgpack(const uint8_t* data, size_t length);
+
 private:
     static constexpr int kMaxMethods = 30;
     RpcEntry table[kMaxMethods];
     int count;
 
-    std::string error_response(const char* msg);
+    json error_response(const char* msg);
+    json dispatch(const json& request);
+    json dispatch_method(const json& request);
     RpcHandlerFn find(const char* name) const;
 };
@@ -5,9 +5,15 @@
 
 #define RX_BUFFER_SIZE 2048
 
+/* Binary requests are framed as a 2-byte big-endian payload length followed
+   by a MessagePack payload. JSON requests start with '{', which is never a
+   valid length high byte for a buffer of RX_BUFFER_SIZE. */
+#define RX_FRAME_HEADER_SIZE 2
+
 typedef struct {
     char data[RX_BUFFER_SIZE];
     uint16_t length;
+    uint8_t binary;   /* 1 = MessagePack payload, 0 = JSON text */
 } rpc_rxbuffer_t;
 
 #endif
\ No newline at end of file
@@ -24,9 +24,28 @@ extern ADC_HandleTypeDef hadc2;
 /* Private variables */
 static osMutexId_t adc_mutex = NULL;
 
+/* Background current sampler */
+static osThreadId_t current_sampler_thread_id = NULL;
+static osSemaphoreId_t current_sampler_start_sem = NULL;
+static osMutexId_t current_sample_mutex = NULL;
+static volatile bool current_sampling_active = false;
+static uint32_t current_sample_interval_ms = 0;
+static uint32_t current_sample_start_tick = 0;
+static current_sample_t current_samples[CURRENT_SAMPLE_BUFFER_SIZE];
+static uint16_t current_sample_head = 0;   /* Index of the oldest sample */
+static uint16_t current_sample_count = 0;
+static uint32_t current_sample_dropped = 0;
+
+static const osThreadAttr_t currentSamplerTask_attributes = {
+    .name = "currentSamplerTask",
+    .stack_size = 1024,
+    .priority = (osPriority_t) osPriorityBelowNormal
+};
+
 /* Private function prototypes */
 static uint16_t read_adc_channel(ADC_HandleTypeDef *hadc, uint32_t channel);
 static uint16_t average_adc_readings(ADC_HandleTypeDef *hadc, uint32_t channel, uint8_t samples);
+static void current_sampler_thread(void *argument);
 
 /**
  * @brief Read a single ADC channel value
@@ -118,6 +137,24 @@ int analog_manager_init(void)
         }
     }
     
+    // Create the background current sampler, idle until current_sampling_start()
+    if (current_sampler_thread_id == NULL)
+    {
+        current_sample_mutex = osMutexNew(NULL);
+        current_sampler_start_sem = osSemaphoreNew(1, 0, NULL);
+        if (current_sample_mutex == NULL || current_sampler_start_sem == NULL)
+        {
+            printf("Failed to create current sampler objects\n");
+            return -1;
+        }
+        current_sampler_thread_id = osThreadNew(current_sampler_thread, NULL, &currentSamplerTask_attributes);
+        if (current_sampler_thread_id == NULL)
+        {
+            printf("Failed to create current sampler thread\n");
+            return -1;
+        }
+    }
+    
     // Calibrate ADCs
     if (HAL_ADCEx_Calibration_Start(&hadc1, ADC_SINGLE_ENDED) != HAL_OK)
     {
@@ -310,3 +347,109 @@ int get_current_feedback_ma_averaged(uint16_t *current_ma, uint8_t num_samples,
 
     return 0;
 }
+
+
+/**
+ * @brief Background current sampler thread
+ * @param argument Unused
+ *
+ * Sleeps until sampling is started, then reads the current feedback every
+ * current_sample_interval_ms into the ring buffer until it is stopped.
+ */
+static void current_sampler_thread(void *argument)
+{
+    (void)argument;
+    uint32_t next_tick = 0;
+    
+    for (;;)
+    {
+        if (!current_sampling_active)
+        {
+            osSemaphoreAcquire(current_sampler_start_sem, osWaitForever);
+            next_tick = osKernelGetTickCount();
+            continue;
+        }
+        
+        uint16_t current_ma = 0;
+        if (get_current_feedback_ma(&current_ma) == 0)
+        {
+            osMutexAcquire(current_sample_mutex, osWaitForever);
+            if (current_sampling_active)
+            {
+                uint16_t index = (uint16_t)((current_sample_head + current_sample_count) % CURRENT_SAMPLE_BUFFER_SIZE);
+                current_samples[index].time_ms = osKernelGetTickCount() - current_sample_start_tick;
+                current_samples[index].current_ma = current_ma;
+                if (current_sample_count < CURRENT_SAMPLE_BUFFER_SIZE)
+                {
+                    current_sample_count++;
+                }
+                else
+                {
+                    // Buffer full, drop the oldest sample
+                    current_sample_head = (uint16_t)((current_sample_head + 1) % CURRENT_SAMPLE_BUFFER_SIZE);
+                    current_sample_dropped++;
+                }
+            }
+            osMutexRelease(current_sample_mutex);
+        }
+        
+        // Fixed-rate schedule; skip ahead instead of bursting if a read overran
+        next_tick += current_sample_interval_ms;
+        if ((int32_t)(next_tick - osKernelGetTickCount()) <= 0)
+        {
+            next_tick = osKernelGetTickCount() + current_sample_interval_ms;
+        }
+        osDelayUntil(next_tick);
+    }
+}
+
+
+int current_sampling_start(uint32_t interval_ms)
+{
+    if (interval_ms == 0 || current_sampler_thread_id == NULL) {
+        return -1;
+    }
+
+    osMutexAcquire(current_sample_mutex, osWaitForever);
+    bool was_active = current_sampling_active;
+    current_sample_interval_ms = interval_ms;
+    current_sample_start_tick = osKernelGetTickCount();
+    current_sample_head = 0;
+    current_sample_count = 0;
+    current_sample_dropped = 0;
+    current_sampling_active = true;
+    osMutexRelease(current_sample_mutex);
+
+    // Wake the sampler; if it is already running it picks up the new settings
+    if (!was_active) {
+        osSemaphoreRelease(current_sampler_start_sem);
+    }
+
+    return 0;
+}
+
+
+uint16_t current_sampling_stop(current_sample_t *samples, uint16_t max_samples, uint32_t *dropped)
+{
+    uint16_t copied = 0;
+
+    if (current_sample_mutex == NULL) {
+        return 0;
+    }
+
+    osMutexAcquire(current_sample_mutex, osWaitForever);
+    current_sampling_active = false;
+
+    // Skip the oldest samples if the caller's buffer is smaller than the ring
+    uint16_t skip = (current_sample_count > max_samples) ? (uint16_t)(current_sample_count - max_samples) : 0;
+    for (uint16_t i = skip; i < current_sample_count && samples != NULL; i++) {
+        samples[copied++] = current_samples[(current_sample_head + i) % CURRENT_SAMPLE_BUFFER_SIZE];
+    }
+
+    if (dropped != NULL) {
+        *dropped = current_sample_dropped + skip;
+    }
+    osMutexRelease(current_sample_mutex);
+
+    return copied;
+}
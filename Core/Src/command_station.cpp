@@ -412,6 +412,12 @@ extern "C" uint8_t CommandStation_GetCustomPacketQueueCount(void) {
   return customPacketQueueCount;
 }
 
+// True once the command station thread is running and no triggered custom
+// packet transmission is still in progress
+extern "C" bool CommandStation_IsIdle(void) {
+  return commandStationRunning && !customPacketTrigger;
+}
+
 // Can be called from anywhere
 // Returns true if stopped, false if not running
 extern "C" bool CommandStation_Stop(void)
@@ -56,22 +56,44 @@ RpcHandlerFn RpcServer::find(const char* name) const {
     return nullptr;
 }
 
-std::string RpcServer::error_response(const char* msg) {
-    json resp = {
+json RpcServer::error_response(const char* msg) {
+    return {
         {"status", "error"},
         {"message", msg ? msg : "error"}
     };
-    return resp.dump();
 }
 
 std::string RpcServer::handle(const std::string& request_str) {
-    json request;
     if (!json::accept(request_str)) {
-        return error_response("Invalid JSON");
+        return error_response("Invalid JSON").dump();
+    }
+    return dispatch(json::parse(request_str)).dump();
+}
+
+std::vector<uint8_t> RpcServer::handle_msgpack(const uint8_t* data, size_t length) {
+    // Parse without exceptions; a malformed payload yields a discarded value
+    json request = json::from_msgpack(data, data + length, true, false);
+    if (request.is_discarded()) {
+        return json::to_msgpack(error_response("Invalid MessagePack"));
+    }
+    return json::to_msgpack(dispatch(request));
+}
+
+json RpcServer::dispatch(const json& request) {
+    json response = dispatch_method(request);
+
+    // Echo the optional request id so the host can match pipelined replies
+    if (request.is_object()) {
+        auto id = request.find("id");
+        if (id != request.end()) {
+            response["id"] = *id;
+        }
     }
-    request = json::parse(request_str);
+    return response;
+}
 
-    if (!request.contains("method") || !request.contains("params")) {
+json RpcServer::dispatch_method(const json& request) {
+    if (!request.is_object() || !request.contains("method") || !request.contains("params")) {
         return error_response("Malformed request");
     }
 
@@ -85,8 +107,7 @@ std::string RpcServer::handle(const std::string& request_str) {
         return error_response("Unknown method");
     }
 
-    json response = handler(request["params"]);
-    return response.dump();
+    return handler(request["params"]);
 }
 
 // ---------------- Handlers ----------------
@@ -155,26 +176,50 @@ static json command_station_stop_handler(const json& params) {
     };
 }
 
+// Parse a hex string such as "033F403C" or "03 3F 40 3C" into bytes.
+// Returns the number of bytes written, or -1 if the string is malformed
+// or holds more than max_length bytes.
+static int parse_hex_bytes(const std::string& hex, uint8_t* out, size_t max_length) {
+    size_t length = 0;
+    int high = -1;
+    for (char c : hex) {
+        int nibble;
+        if (c >= '0' && c <= '9') {
+            nibble = c - '0';
+        } else if (c >= 'a' && c <= 'f') {
+            nibble = c - 'a' + 10;
+        } else if (c >= 'A' && c <= 'F') {
+            nibble = c - 'A' + 10;
+        } else if (c == ' ' && high < 0) {
+            continue;
+        } else {
+            return -1;
+        }
+        if (high < 0) {
+            high = nibble;
+        } else {
+            if (length >= max_length) {
+                return -1;
+            }
+            out[length++] = static_cast<uint8_t>((high << 4) | nibble);
+            high = -1;
+        }
+    }
+    return (high < 0) ? static_cast<int>(length) : -1;
+}
+
 static json command_station_load_packet_handler(const json& params) {
     if (!params.is_object() || !params.contains("bytes")) {
         return {
             {"status", "error"},
-            {"message", "params must contain 'bytes' array"}
+            {"message", "params must contain 'bytes' array or hex string"}
         };
     }
     
-    if (!params["bytes"].is_array()) {
+    if (!params["bytes"].is_array() && !params["bytes"].is_string() && !params["bytes"].is_binary()) {
         return {
             {"status", "error"},
-            {"message", "'bytes' must be an array"}
-        };
-    }
-    
-    auto bytes_array = params["bytes"];
-    if (bytes_array.empty() || bytes_array.size() > DCC_MAX_PACKET_SIZE) {
-        return {
-            {"status", "error"},
-            {"message", "bytes array must have 1-18 elements"}
+            {"message", "'bytes' must be an array or a hex string"}
         };
     }
     
@@ -192,21 +237,63 @@ static json command_station_load_packet_handler(const json& params) {
     uint8_t bytes[DCC_MAX_PACKET_SIZE];
     uint8_t length = 0;
     
-    for (const auto& byte : bytes_array) {
-        if (!byte.is_number_unsigned()) {
+    if (params["bytes"].is_string()) {
+        // Compact form: one hex string instead of one JSON number per byte
+        int parsed = parse_hex_bytes(params["bytes"].get_ref<const std::string&>(),
+                                     bytes, DCC_MAX_PACKET_SIZE);
+        if (parsed < 0) {
             return {
                 {"status", "error"},
-                {"message", "all bytes must be unsigned integers"}
+                {"message", "bytes string must be 1-18 hex byte pairs"}
             };
         }
-        uint32_t val = byte.get<uint32_t>();
-        if (val > 0xFF) {
+        length = static_cast<uint8_t>(parsed);
+    }
+    else if (params["bytes"].is_binary()) {
+        // MessagePack requests carry the packet as raw bin data
+        const auto& binary = params["bytes"].get_binary();
+        if (binary.size() > DCC_MAX_PACKET_SIZE) {
             return {
                 {"status", "error"},
-                {"message", "byte values must be 0-255"}
+                {"message", "bytes array must have 1-18 elements"}
             };
         }
-        bytes[length++] = static_cast<uint8_t>(val);
+        for (uint8_t byte : binary) {
+            bytes[length++] = byte;
+        }
+    }
+    else {
+        const auto& bytes_array = params["bytes"];
+        if (bytes_array.size() > DCC_MAX_PACKET_SIZE) {
+            return {
+                {"status", "error"},
+                {"message", "bytes array must have 1-18 elements"}
+            };
+        }
+        
+        for (const auto& byte : bytes_array) {
+            if (!byte.is_number_unsigned()) {
+                return {
+                    {"status", "error"},
+                    {"message", "all bytes must be unsigned integers"}
+                };
+            }
+            uint32_t val = byte.get<uint32_t>();
+            if (val > 0xFF) {
+                return {
+                    {"status", "error"},
+                    {"message", "byte values must be 0-255"}
+                };
+            }
+            bytes[length++] = static_cast<uint8_t>(val);
+        }
+    }
+    
+    if (length == 0) {
+        return {
+            {"status", "error"},
+            {"message", "bytes array must have 1-18 elements"}
+        };
     }
     
     if (!CommandStation_LoadCustomPacket(bytes, length, replace)) {
@@ -248,6 +335,48 @@ static json command_station_transmit_packet_handler(const json& params) {
     };
 }
 
+static json command_station_wait_idle_handler(const json& params) {
+    uint32_t timeout_ms = 1000;  // Default to 1 second
+    
+    // Parse optional timeout_ms parameter
+    if (params.contains("timeout_ms")) {
+        if (!params["timeout_ms"].is_number_unsigned()) {
+            return {
+                {"status", "error"},
+                {"message", "timeout_ms must be a positive integer"}
+            };
+        }
+        timeout_ms = params["timeout_ms"].get<uint32_t>();
+        if (timeout_ms > 10000) {
+            return {
+                {"status", "error"},
+                {"message", "timeout_ms must be between 0 and 10000"}
+            };
+        }
+    }
+    
+    // Poll until the command station thread is up and has finished any
+    // triggered custom packet transmission
+    uint32_t waited_ms = 0;
+    while (!CommandStation_IsIdle()) {
+        if (waited_ms >= timeout_ms) {
+            return {
+                {"status", "error"},
+                {"message", "Timed out waiting for command station to become idle"},
+                {"waited_ms", waited_ms}
+            };
+        }
+        osDelay(5u);
+        waited_ms += 5;
+    }
+    
+    return {
+        {"status", "ok"},
+        {"message", "Command station idle"},
+        {"waited_ms", waited_ms}
+    };
+}
+
 static json decoder_start_handler(const json& params) {
     (void)params;  // Unused parameter
     
@@ -661,6 +790,62 @@ static json get_current_feedback_ma_handler(const json& params) {
     };
 }
 
+static json current_sampling_start_handler(const json& params) {
+    uint32_t interval_ms = 50;  // Default to 20 samples per second
+    
+    // Parse optional interval_ms parameter
+    if (params.contains("interval_ms")) {
+        if (!params["interval_ms"].is_number_unsigned()) {
+            return {
+                {"status", "error"},
+                {"message", "interval_ms must be a positive integer"}
+            };
+        }
+        interval_ms = params["interval_ms"].get<uint32_t>();
+        if (interval_ms < 5 || interval_ms > 1000) {
+            return {
+                {"status", "error"},
+                {"message", "interval_ms must be between 5 and 1000"}
+            };
+        }
+    }
+    
+    if (current_sampling_start(interval_ms) != 0) {
+        return {
+            {"status", "error"},
+            {"message", "Failed to start current sampling"}
+        };
+    }
+    
+    return {
+        {"status", "ok"},
+        {"interval_ms", interval_ms},
+        {"max_samples", CURRENT_SAMPLE_BUFFER_SIZE}
+    };
+}
+
+static json current_sampling_stop_and_fetch_handler(const json& params) {
+    (void)params;
+    
+    // Static to keep the RPC thread stack small
+    static current_sample_t samples[CURRENT_SAMPLE_BUFFER_SIZE];
+    uint32_t dropped = 0;
+    uint16_t count = current_sampling_stop(samples, CURRENT_SAMPLE_BUFFER_SIZE, &dropped);
+    
+    // [time_ms, current_ma] pairs, oldest first; time is relative to the start
+    json sample_list = json::array();
+    for (uint16_t i = 0; i < count; i++) {
+        sample_list.push_back({samples[i].time_ms, samples[i].current_ma});
+    }
+    
+    return {
+        {"status", "ok"},
+        {"count", count},
+        {"dropped", dropped},
+        {"samples", sample_list}
+    };
+}
+
 static json get_gpio_input_handler(const json& params) {
     // Check if pin parameter exists
     if (!params.contains("pin") || !params["pin"].is_number_integer()) {
@@ -983,6 +1168,43 @@ static json set_gpio_output_handler(const json& params) {
     };
 }
 
+static json mirror_gpio_handler(const json& params) {
+    // Check if src and dst parameters exist
+    if (!params.contains("src") || !params["src"].is_number_integer()) {
+        return {
+            {"status", "error"},
+            {"message", "Missing or invalid 'src' parameter (must be 1-16)"}
+        };
+    }
+    
+    if (!params.contains("dst") || !params["dst"].is_number_integer()) {
+        return {
+            {"status", "error"},
+            {"message", "Missing or invalid 'dst' parameter (must be 1-15)"}
+        };
+    }
+    
+    // Read the source input and drive the destination output in one request,
+    // reusing the single-pin handlers for validation
+    json input = get_gpio_input_handler({{"pin", params["src"]}});
+    if (input["status"] != "ok") {
+        return input;
+    }
+    
+    int value = input["value"].get<int>();
+    json output = set_gpio_output_handler({{"pin", params["dst"]}, {"state", value}});
+    if (output["status"] != "ok") {
+        return output;
+    }
+    
+    return {
+        {"status", "ok"},
+        {"src", input["pin"]},
+        {"dst", output["pin"]},
+        {"value", value}
+    };
+}
+
 static json get_rtc_datetime_handler(const json& params) {
     (void)params;  // Unused parameter
     
@@ -1260,6 +1482,7 @@ void RpcServerThread(void* argument) {
     server.register_method("command_station_stop", command_station_stop_handler);
     server.register_method("command_station_load_packet", command_station_load_packet_handler);
     server.register_method("command_station_transmit_packet", command_station_transmit_packet_handler);
+    server.register_method("command_station_wait_idle", command_station_wait_idle_handler);
     server.register_method("command_station_params", command_station_params_handler);
     server.register_method("command_station_packet_override", command_station_packet_override_handler);
     server.register_method("command_station_packet_reset_override", command_station_packet_reset_override_handler);
@@ -1273,10 +1496,13 @@ void RpcServerThread(void* argument) {
     server.register_method("system_reboot", system_reboot_handler);
     server.register_method("get_voltage_feedback_mv", get_voltage_feedback_mv_handler);
     server.register_method("get_current_feedback_ma", get_current_feedback_ma_handler);
+    server.register_method("current_sampling_start", current_sampling_start_handler);
+    server.register_method("current_sampling_stop_and_fetch", current_sampling_stop_and_fetch_handler);
     server.register_method("get_gpio_input", get_gpio_input_handler);
     server.register_method("get_gpio_inputs", get_gpio_inputs_handler);
     server.register_method("configure_gpio_output", configure_gpio_output_handler);
     server.register_method("set_gpio_output", set_gpio_output_handler);
+    server.register_method("mirror_gpio", mirror_gpio_handler);
     server.register_method("get_rtc_datetime", get_rtc_datetime_handler);
     server.register_method("set_rtc_datetime", set_rtc_datetime_handler);
     server.register_method("system_usb_status", system_usb_status_handler);
@@ -1286,6 +1512,20 @@ void RpcServerThread(void* argument) {
         // Block until a message pointer is available from RX thread
         if (tx_queue_receive(&rpc_rxqueue, &msg, 10) == TX_SUCCESS)
         {
+            if (msg->binary) {
+                // Reply in the same framing: 2-byte big-endian length + MessagePack
+                std::vector<uint8_t> payload = server.handle_msgpack(
+                    reinterpret_cast<const uint8_t*>(msg->data), msg->length);
+                std::vector<uint8_t> response;
+                response.reserve(payload.size() + RX_FRAME_HEADER_SIZE);
+                response.push_back(static_cast<uint8_t>(payload.size() >> 8));
+                response.push_back(static_cast<uint8_t>(payload.size() & 0xFF));
+                response.insert(response.end(), payload.begin(), payload.end());
+                UsbCdcAcm_Write(response.data(),
+                                (uint32_t)response.size(),
+                                &actual_length);
+                continue;
+            }
             std::string request(msg->data, msg->length);
             std::string response = server.handle(request) + "\r\n";
             /* transport_send(response);*/
@@ -6,137 +6,55 @@ Acceptance Test with Bit 0 Duration Change
 This script runs AcceptanceTestPacketAllStop.py twice:
 1. First run: Normal test with default bit 0 duration
 2. Second run: Change bit 0 duration to 200μs just before emergency stop
+
+Usage:
+    python AcceptanceTestWithBit0Change.py                  # both runs on COM6, one after the other
+    python AcceptanceTestWithBit0Change.py COM6 COM7        # one run per fixture, at the same time
+    python AcceptanceTestWithBit0Change.py COM6 COM7 --sequential
 """
 
-import subprocess
+import argparse
+import bisect
+import concurrent.futures
 import sys
-import os
-import json
 import serial
 import time
 
+from dcc_common import (DCCTesterRPC, buffered_output, log, log_enabled,
+                        make_speed_packet, make_emergency_stop_packet, set_log_level)
 
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-    
-    def __init__(self, port, baudrate=115200, timeout=2):
-        """
-        Initialize RPC client.
-        
-        Args:
-            port: Serial port (e.g., 'COM3' on Windows or '/dev/ttyACM0' on Linux)
-            baudrate: Serial baud rate (default: 115200)
-            timeout: Serial timeout in seconds (default: 2)
-        """
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)  # Allow time for connection to establish
-        
-    def send_rpc(self, method, params):
-        """
-        Send an RPC request and return the response.
-        
-        Args:
-            method: RPC method name
-            params: Dictionary of parameters
-            
-        Returns:
-            Response dictionary
-        """
-        request = {
-            "method": method,
-            "params": params
-        }
-        
-        request_json = json.dumps(request) + '\r\n'
-        print(f"→ {request_json.strip()}")
-        
-        self.ser.write(request_json.encode('utf-8'))
-        
-        # Read response
-        response_line = self.ser.readline().decode('utf-8').strip()
-        print(f"← {response_line}")
-        
-        if response_line:
-            return json.loads(response_line)
-        return None
-    
-    def close(self):
-        """Close serial connection."""
-        self.ser.close()
 
+# The broadcast emergency stop is the same for every run, so build it once at import
+ESTOP_BROADCAST_PACKET = make_emergency_stop_packet(0)  # Address 0 = broadcast
 
-def calculate_dcc_checksum(bytes_list):
-    """
-    Calculate DCC packet checksum (XOR of all bytes).
-    
-    Args:
-        bytes_list: List of packet bytes (address + instruction)
-        
-    Returns:
-        Checksum byte
-    """
-    checksum = 0
-    for byte in bytes_list:
-        checksum ^= byte
-    return checksum
+CURRENT_SAMPLE_INTERVAL_MS = 50  # Background current sampling interval
+MOTOR_RUN_TIME_S = 0.5    # Time the motor runs before measuring current
+MOTOR_STOP_TIME_S = 1.0   # Time allowed for the motor to stop after emergency stop
 
 
-def make_speed_packet(address, speed, forward=True):
+def current_at(samples, time_ms):
     """
-    Create a DCC advanced operations speed packet (128-speed step mode).
+    Return the last sampled current at or before a point in the test.
     
     Args:
-        address: Locomotive address (0-127 for short address)
-        speed: Speed value (0-127, where 0=stop, 1=emergency stop, 2-127=speed steps)
-        forward: True for forward, False for reverse
+        samples: [time_ms, current_ma] pairs from current_sampling_stop_and_fetch, oldest first
+        time_ms: Time since sampling started in milliseconds
         
     Returns:
-        List of packet bytes
+        Current in mA (the first sample if none is that early), or None without samples
     """
-    # Advanced operations speed instruction: 0b00111111 (0x3F)
-    instruction = 0x3F
-    
-    # Speed byte: bit 7 = direction (1=forward, 0=reverse), bits 6-0 = speed
-    if forward:
-        speed_byte = (1 << 7) | (speed & 0x7F)
-    else:
-        speed_byte = speed & 0x7F
-    
-    packet = [address, instruction, speed_byte]
-    checksum = calculate_dcc_checksum(packet)
-    packet.append(checksum)
-    
-    return packet
-
-
-def make_emergency_stop_packet(address):
-    """
-    Create a DCC emergency stop packet.
-    
-    Args:
-        address: Locomotive address (0 for broadcast to all locomotives)
-        
-    Returns:
-        List of packet bytes
-    """
-    # Advanced operations speed instruction: 0x3F
-    # Emergency stop: speed = 1, direction = forward (bit 7 = 1)
-    instruction = 0x3F
-    speed_byte = (1 << 7) | 1  # 0x81
-    
-    packet = [address, instruction, speed_byte]
-    checksum = calculate_dcc_checksum(packet)
-    packet.append(checksum)
-    
-    return packet
+    if not samples:
+        return None
+    index = bisect.bisect_right([sample[0] for sample in samples], time_ms) - 1
+    return samples[max(index, 0)][1]
 
 
-def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta):
+def run_test_with_bit0_change(rpc, loco_address, half_speed, override_delta):
     """
     Run acceptance test with packet override for second zero bit.
     
     Args:
-        com_port: Serial port name
+        rpc: Connected DCCTesterRPC instance (left open for the caller)
         loco_address: Locomotive address
         half_speed: Speed value for half speed
         override_delta: Delta P-phase adjustment in microseconds (None = don't override)
@@ -154,14 +72,26 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
     print()
     
     try:
-        # Connect to DCC_tester
-        print(f"Connecting to {com_port}...")
-        rpc = DCCTesterRPC(com_port)
-        print("Connected!\n")
+        # The initial stop, the scope trigger setting and the start of
+        # background current sampling are independent, so submit them together.
+        # The firmware samples the current throughout the test and returns all
+        # samples in one reply at the end, instead of one request per reading.
+        stop_response, params_response, sampling_response = rpc.send_rpc_batch([
+            ("command_station_stop", {}),
+            ("command_station_params", {"trigger_first_bit": True}),
+            ("current_sampling_start", {"interval_ms": CURRENT_SAMPLE_INTERVAL_MS}),
+        ])
+        # Sample times count from when the firmware handled the last request of
+        # the batch, which is just before its reply arrived; zero the host
+        # marks there so they line up with the samples
+        sampling_started_at = time.monotonic()
+        
+        def elapsed_ms():
+            return (time.monotonic() - sampling_started_at) * 1000
         
         # Initial cleanup: Stop command station
         print("Initial setup: Stopping command station (if running)...")
-        response = rpc.send_rpc("command_station_stop", {})
+        response = stop_response
         if response is None or response.get("status") != "ok":
             print(f"WARNING: Failed to stop command station: {response}")
         else:
@@ -169,54 +99,64 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
         
         # Pre-step: Enable scope trigger on first bit
         print("Pre-step: Enabling scope trigger on first bit...")
-        response = rpc.send_rpc("command_station_params", {"trigger_first_bit": True})
+        response = params_response
         if response is None or response.get("status") != "ok":
             print(f"WARNING: Failed to enable scope trigger: {response}")
         else:
             print("✓ Scope trigger enabled\n")
         
+        if sampling_response is None or sampling_response.get("status") != "ok":
+            print(f"ERROR: Failed to start current sampling: {sampling_response}")
+            return 1
+        
+        # Start, the readiness wait and the packet load are processed by the
+        # firmware in order, so queue all three at once and let the firmware
+        # work through them while the host handles each reply. The packet only
+        # goes out when transmit is triggered in step 5.
+        packet = make_speed_packet(loco_address, half_speed, forward=False)
+        start_response, ready_response, load_response = rpc.send_rpc_batch([
+            ("command_station_start", {"loop": 0}),
+            ("command_station_wait_idle", {"timeout_ms": 1000}),
+            ("command_station_load_packet", {"bytes": packet}),
+        ])
+        
         # Step 1: Start command station in custom packet mode (loop=0)
         print("Step 1: Starting command station in custom packet mode...")
-        response = rpc.send_rpc("command_station_start", {"loop": 0})
+        response = start_response
         
         if response is None or response.get("status") != "ok":
             print(f"ERROR: Failed to start command station: {response}")
-            rpc.close()
             return 1
         print(f"✓ Command station started (loop={response.get('loop', 0)})\n")
         
-        time.sleep(0.5)
-        
-        # Step 2: Read motor off current as baseline
-        print("Step 2: Reading motor off current as baseline...")
-        response = rpc.send_rpc("get_current_feedback_ma", {})
-        
+        # Answered as soon as the command station thread is running
+        response = ready_response
         if response is None or response.get("status") != "ok":
-            print(f"ERROR: Failed to read current: {response}")
-            rpc.close()
-            return 1
+            print(f"WARNING: Command station not ready: {response}")
         
-        motor_off_current_ma = response.get("current_ma", 0)
-        print(f"✓ Motor off current: {motor_off_current_ma} mA (baseline)\n")
+        # Step 2: Mark the motor off current baseline
+        print("Step 2: Marking motor off current as baseline...")
+        motor_off_mark_ms = elapsed_ms()
+        print(f"✓ Baseline taken from the current sample at {motor_off_mark_ms:.0f} ms\n")
         
         # Step 3: Create half-speed reverse packet
         print("Step 3: Creating half-speed reverse packet...")
-        packet = make_speed_packet(loco_address, half_speed, forward=False)
         print(f"Packet for address {loco_address}, speed {half_speed} reverse:")
-        print(f"  Bytes: {' '.join(f'0x{b:02X}' for b in packet)}")
-        print(f"  Binary breakdown:")
-        print(f"    Address:     0x{packet[0]:02X} ({packet[0]})")
-        print(f"    Instruction: 0x{packet[1]:02X} (advanced operations speed)")
-        print(f"    Speed:       0x{packet[2]:02X} (dir=reverse, speed={half_speed})")
-        print(f"    Checksum:    0x{packet[3]:02X}\n")
+        # The per-byte breakdown is only formatted at the verbose log level
+        if log_enabled(2):
+            log(2, f"  Bytes: {packet.hex(' ').upper()}")
+            log(2, f"  Binary breakdown:")
+            log(2, f"    Address:     0x{packet[0]:02X} ({packet[0]})")
+            log(2, f"    Instruction: 0x{packet[1]:02X} (advanced operations speed)")
+            log(2, f"    Speed:       0x{packet[2]:02X} (dir=reverse, speed={half_speed})")
+            log(2, f"    Checksum:    0x{packet[3]:02X}\n")
         
         # Step 4: Load the packet
         print("Step 4: Loading packet into command station...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": packet})
+        response = load_response
         
         if response is None or response.get("status") != "ok":
             print(f"ERROR: Failed to load packet: {response}")
-            rpc.close()
             return 1
         print(f"✓ Packet loaded (length={response.get('length')} bytes)\n")
         
@@ -227,55 +167,56 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
         
         if response is None or response.get("status") != "ok":
             print(f"ERROR: Failed to transmit packet: {response}")
-            rpc.close()
             return 1
+        triggered_at = time.monotonic()
         
-        # Step 6: motor run time
-        time.sleep(0.5)        
-
-        # Step 7: Read motor run current
-        print("Step 7: Reading motor run current...")
-        response = rpc.send_rpc("get_current_feedback_ma", {})
-        
+        # Step 6: motor run time, counted from the trigger once all packets are out
+        response = rpc.wait_idle()
         if response is None or response.get("status") != "ok":
-            print(f"ERROR: Failed to read current: {response}")
-            rpc.close()
-            return 1
-        
-        motor_on_current_ma = response.get("current_ma", 0)
-        print(f"✓ Motor run current: {motor_on_current_ma} mA\n")
+            print(f"WARNING: Transmission did not complete: {response}")
+        time.sleep(max(0.0, MOTOR_RUN_TIME_S - (time.monotonic() - triggered_at)))
+
+        # Step 7: Mark the motor run current
+        print("Step 7: Marking motor run current...")
+        motor_on_mark_ms = elapsed_ms()
+        print(f"✓ Run current taken from the current sample at {motor_on_mark_ms:.0f} ms\n")
 
         # Step 8: Create and load BROADCAST emergency stop packet (address 0)
         print(f"Step 8: Creating and loading BROADCAST emergency stop packet...")
-        estop_packet = make_emergency_stop_packet(0)  # Address 0 = broadcast
+        estop_packet = ESTOP_BROADCAST_PACKET
         print(f"Broadcast emergency stop packet (address 0x00):")
-        print(f"  Bytes: {' '.join(f'0x{b:02X}' for b in estop_packet)}")
-        print(f"  Binary breakdown:")
-        print(f"    Address:     0x{estop_packet[0]:02X} (0 = BROADCAST)")
-        print(f"    Instruction: 0x{estop_packet[1]:02X} (advanced operations speed)")
-        print(f"    Speed:       0x{estop_packet[2]:02X} (emergency stop)")
-        print(f"    Checksum:    0x{estop_packet[3]:02X}\n")
-        
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": estop_packet})
+        if log_enabled(2):
+            log(2, f"  Bytes: {estop_packet.hex(' ').upper()}")
+            log(2, f"  Binary breakdown:")
+            log(2, f"    Address:     0x{estop_packet[0]:02X} (0 = BROADCAST)")
+            log(2, f"    Instruction: 0x{estop_packet[1]:02X} (advanced operations speed)")
+            log(2, f"    Speed:       0x{estop_packet[2]:02X} (emergency stop)")
+            log(2, f"    Checksum:    0x{estop_packet[3]:02X}\n")
+        
+        # The emergency stop load and the override setting are independent
+        estop_calls = [("command_station_load_packet", {"bytes": estop_packet})]
+        if override_delta is not None:
+            # Bit position 2 (0-indexed as bit 1) is the second zero bit after preamble
+            # Binary: 0b10 = 0x02
+            estop_calls.append(("command_station_packet_override", {
+                "zerobit_override_mask": 4,
+                "zerobit_deltaP": override_delta,
+                "zerobit_deltaN": -override_delta
+            }))
+        estop_responses = rpc.send_rpc_batch(estop_calls)
+        
+        response = estop_responses[0]
         if response is None or response.get("status") != "ok":
             print(f"ERROR: Failed to load emergency stop packet: {response}")
-            rpc.close()
             return 1
         print(f"✓ Emergency stop packet loaded (length={response.get('length')} bytes)\n")
 
         # Step 8.5: Set packet override if specified (just before transmission)
         if override_delta is not None:
             print(f"Step 8.5: Setting packet override for second zero bit (mask=0x02, deltaP=+{override_delta}μs, deltaN=-{override_delta}μs)...")
-            # Bit position 2 (0-indexed as bit 1) is the second zero bit after preamble
-            # Binary: 0b10 = 0x02
-            response = rpc.send_rpc("command_station_packet_override", {
-                "zerobit_override_mask": 4,
-                "zerobit_deltaP": override_delta,
-                "zerobit_deltaN": -override_delta
-            })
+            response = estop_responses[1]
             if response is None or response.get("status") != "ok":
                 print(f"ERROR: Failed to set packet override: {response}")
-                rpc.close()
                 return 1
             print(f"✓ Packet override set: second zero bit will have P-phase +{override_delta}μs, N-phase -{override_delta}μs\n")
 
@@ -285,39 +226,62 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
                                {"count": 1, "delay_ms": 100})
         if response is None or response.get("status") != "ok":
             print(f"ERROR: Failed to transmit emergency stop packet: {response}")
-            rpc.close()
             return 1
+        triggered_at = time.monotonic()
         print(f"✓ Emergency stop packet transmission triggered")
         print(f"  Count: {response.get('count')}\n")
         
-        print(f"Waiting 1 second for motor stop")
-        time.sleep(1.0)
+        # Wait for the packet to go out, then give the motor the full stop
+        # time from the trigger; wait_idle() returns once the packet is
+        # queued, before the motor has reacted to it
+        print(f"Waiting {MOTOR_STOP_TIME_S:g} second for motor stop")
+        response = rpc.wait_idle()
+        if response is None or response.get("status") != "ok":
+            print(f"WARNING: Transmission did not complete: {response}")
+        time.sleep(max(0.0, MOTOR_STOP_TIME_S - (time.monotonic() - triggered_at)))
+        print(f"  Waited {time.monotonic() - triggered_at:.2f} s for motor stop")
+        
+        # Teardown: override reset, fetching the current samples and stop do
+        # not depend on each other, so submit them together
+        teardown = [
+            ("current_sampling_stop_and_fetch", {}),
+            ("command_station_stop", {}),
+        ]
+        if override_delta is not None:
+            teardown.insert(0, ("command_station_packet_reset_override", {}))
+        teardown_responses = rpc.send_rpc_batch(teardown)
+        samples_response, stop_response = teardown_responses[-2:]
         
         # Step 9.5: Reset packet override if it was set
         if override_delta is not None:
             print("\nStep 9.5: Resetting packet override parameters to zero...")
-            response = rpc.send_rpc("command_station_packet_reset_override", {})
+            response = teardown_responses[0]
             if response is None or response.get("status") != "ok":
                 print(f"ERROR: Failed to reset packet override: {response}")
-                rpc.close()
                 return 1
             print("✓ Packet override reset to zero\n")
         
-        # Step 10: Read motor stopped current
-        print("\nStep 10: Reading motor stopped current...")
-        response = rpc.send_rpc("get_current_feedback_ma", {})
+        # Step 10: Read the sampled currents; the last sample is the stopped current
+        print("\nStep 10: Reading sampled motor currents...")
+        response = samples_response
         
-        if response is None or response.get("status") != "ok":
-            print(f"ERROR: Failed to read current: {response}")
-            rpc.close()
+        if (response is None or response.get("status") != "ok" or
+                not response.get("samples")):
+            print(f"ERROR: Failed to read current samples: {response}")
             return 1
         
-        motor_stopped_current_ma = response.get("current_ma", 0)
+        samples = response["samples"]
+        motor_off_current_ma = current_at(samples, motor_off_mark_ms)
+        motor_on_current_ma = current_at(samples, motor_on_mark_ms)
+        motor_stopped_current_ma = samples[-1][1]
+        print(f"✓ {len(samples)} samples every {CURRENT_SAMPLE_INTERVAL_MS} ms")
+        print(f"✓ Motor off current: {motor_off_current_ma} mA (baseline)")
+        print(f"✓ Motor run current: {motor_on_current_ma} mA")
         print(f"✓ Motor stopped current: {motor_stopped_current_ma} mA\n")
         
         # Step 11: Stop command station
         print("Step 11: Stopping command station...")
-        response = rpc.send_rpc("command_station_stop", {})
+        response = stop_response
         
         if response is None or response.get("status") != "ok":
             print(f"WARNING: Failed to stop command station: {response}")
@@ -347,7 +311,7 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
         print(f"  3. Created half-speed reverse packet")
         print(f"  4. Loaded packet into command station")
         print(f"  5. Transmitted 3 half-speed reverse packets to address {loco_address}")
-        print(f"  6. Motor run time: 0.5 seconds")
+        print(f"  6. Motor run time: {MOTOR_RUN_TIME_S:g} seconds")
         print(f"  7. Read motor run current: {motor_on_current_ma} mA")
         print(f"  8. Created and loaded BROADCAST emergency stop packet (address 0x00)")
         if override_delta is not None:
@@ -366,14 +330,11 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
             print(f"  Second zero bit P-phase increased by {override_delta}μs (mask: 0x02)")
         print()
         
-        # Close connection
-        rpc.close()
-        
         return 0 if test_passed else 1
         
     except serial.SerialException as e:
         print(f"\nERROR: Serial port error: {e}")
-        print(f"Make sure {com_port} is the correct port and the device is connected.")
+        print(f"Make sure {rpc.ser.port} is the correct port and the device is connected.")
         return 1
     except KeyboardInterrupt:
         print("\n\nTest interrupted by user.")
@@ -385,6 +346,46 @@ def run_test_with_bit0_change(com_port, loco_address, half_speed, override_delta
         return 1
 
 
+def print_test_header(override_delta):
+    """Print the banner for Test 1 (no override) or Test 2 (override_delta set)."""
+    print("\n" + "#" * 70)
+    if override_delta is None:
+        print("# TEST 1: NORMAL RUN (Default Bit 0 Duration)")
+    else:
+        print(f"# TEST 2: PACKET OVERRIDE (Second Zero Bit P-phase +{override_delta}μs)")
+    print("#" * 70 + "\n")
+
+
+def run_tests_concurrently(runs, loco_address, half_speed):
+    """
+    Run the tests at the same time, one worker thread per test fixture.
+    
+    Each test spends nearly all its time waiting on its own serial port, so
+    the threads do not hold each other up. Each test's output is printed as
+    one block when that test finishes.
+    
+    Args:
+        runs: Sequence of (rpc, override_delta) tuples, one connection per fixture
+        loco_address: Locomotive address
+        half_speed: Speed value for half speed
+        
+    Returns:
+        List of results (0 on success, 1 on failure), in the order of runs
+    """
+    def run(rpc, override_delta):
+        with buffered_output():
+            print_test_header(override_delta)
+            return run_test_with_bit0_change(rpc, loco_address, half_speed, override_delta)
+    
+    results = [1] * len(runs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(runs)) as executor:
+        futures = {executor.submit(run, rpc, override_delta): index
+                   for index, (rpc, override_delta) in enumerate(runs)}
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
 def main():
     """Main test orchestrator."""
     
@@ -393,6 +394,33 @@ def main():
     LOCO_ADDRESS = 3   # Locomotive address for speed test
     HALF_SPEED = 64    # Half of 127 (rounded up from 63.5)
     
+    parser = argparse.ArgumentParser(
+        description="Run the acceptance test normally, then with a second zero bit override"
+    )
+    parser.add_argument(
+        "ports",
+        nargs="*",
+        metavar="PORT",
+        help=f"Serial port for Test 1, optionally followed by a second fixture's port "
+             f"for Test 2 (default: {COM_PORT})"
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="With two ports, still run Test 2 only after Test 1 passes"
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Print every RPC request and response with timestamps"
+    )
+    args = parser.parse_args()
+    if args.verbose:
+        set_log_level(2)
+    ports = args.ports or [COM_PORT]
+    if len(ports) > 2:
+        parser.error("at most two ports can be given")
+    
     print("\n" + "=" * 70)
     print("DUAL ACCEPTANCE TEST")
     print("Test 1: Normal run (default bit 0 duration)")
@@ -400,48 +428,67 @@ def main():
     print("=" * 70)
     print()
     
-    # Run Test 1: Normal test
-    print("\n" + "#" * 70)
-    print("# TEST 1: NORMAL RUN (Default Bit 0 Duration)")
-    print("#" * 70 + "\n")
-    
-    result1 = run_test_with_bit0_change(COM_PORT, LOCO_ADDRESS, HALF_SPEED, None)
+    # Open each port once; on a single port both tests share the connection
+    connections = {}
+    try:
+        for port in ports:
+            if port not in connections:
+                print(f"Connecting to {port}...")
+                connections[port] = DCCTesterRPC(port)
+                print("Connected!\n")
+        
+        # (rpc, override_delta) for Test 1 and Test 2
+        runs = [(connections[ports[0]], None), (connections[ports[-1]], +20)]
+        
+        if len(connections) > 1 and not args.sequential:
+            # Separate fixtures do not share a device, so run both tests at once
+            result1, result2 = run_tests_concurrently(runs, LOCO_ADDRESS, HALF_SPEED)
+        else:
+            # Run Test 1: Normal test
+            print_test_header(None)
+            
+            # Each run takes a few seconds; print its output in one write at the end
+            with buffered_output():
+                result1 = run_test_with_bit0_change(runs[0][0], LOCO_ADDRESS, HALF_SPEED, runs[0][1])
+            
+            if result1 != 0:
+                print("\n" + "!" * 70)
+                print("! TEST 1 FAILED - Aborting Test 2")
+                print("!" * 70)
+                return 1
+            
+            print("\n" + "✓" * 70)
+            print("✓ TEST 1 PASSED - Proceeding to Test 2")
+            print("✓" * 70)
+            
+            # Run Test 2: Modified test with packet override. Test 1 ends with the
+            # motor stopped and verified, so there is no need to wait before it.
+            print_test_header(runs[1][1])
+            
+            with buffered_output():
+                result2 = run_test_with_bit0_change(runs[1][0], LOCO_ADDRESS, HALF_SPEED, runs[1][1])
     
-    if result1 != 0:
-        print("\n" + "!" * 70)
-        print("! TEST 1 FAILED - Aborting Test 2")
-        print("!" * 70)
+    except serial.SerialException as e:
+        print(f"\nERROR: Serial port error: {e}")
+        print(f"Make sure {port} is the correct port and the device is connected.")
         return 1
+    finally:
+        # Close connections once both tests are done
+        for rpc in connections.values():
+            rpc.close()
     
-    print("\n" + "✓" * 70)
-    print("✓ TEST 1 PASSED - Proceeding to Test 2")
-    print("✓" * 70)
-    
-    # Wait between tests
-    time.sleep(2)
-    
-    # Run Test 2: Modified test with packet override
-    print("\n" + "#" * 70)
-    print("# TEST 2: PACKET OVERRIDE (Second Zero Bit P-phase +20μs)")
-    print("#" * 70 + "\n")
-    
-    result2 = run_test_with_bit0_change(COM_PORT, LOCO_ADDRESS, HALF_SPEED, +20)
-    
-    # Final summary
-    print("\n\n" + "=" * 70)
-    print("FINAL SUMMARY")
-    print("=" * 70)
-    print(f"Test 1 (Normal):        {'PASS ✓' if result1 == 0 else 'FAIL ✗'}")
-    print(f"Test 2 (Override+20μs): {'PASS ✓' if result2 == 0 else 'FAIL ✗'}")
-    print("=" * 70)
+    # Final summary, written in one go like the test output
+    all_passed = result1 == 0 and result2 == 0
+    with buffered_output():
+        print("\n\n" + "=" * 70)
+        print("FINAL SUMMARY")
+        print("=" * 70)
+        print(f"Test 1 (Normal):        {'PASS ✓' if result1 == 0 else 'FAIL ✗'}")
+        print(f"Test 2 (Override+20μs): {'PASS ✓' if result2 == 0 else 'FAIL ✗'}")
+        print("=" * 70)
+        print("✓ ALL TESTS PASSED" if all_passed else "✗ SOME TESTS FAILED")
     
-    if result1 == 0 and result2 == 0:
-        print("✓ ALL TESTS PASSED")
-        return 0
-    else:
-        print("✗ SOME TESTS FAILED")
-        return 1
-
+    return 0 if all_passed else 1
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -15,80 +15,64 @@ Hardware connections:
 - IO14: Output that mirrors IO13 when button is pressed
 """
 
-import json
+import argparse
+import os
 import serial
 import time
 import sys
 
+# The shared RPC client lives in the Scripts directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dcc_common import DCCTesterRPC, set_log_level
 
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
+
+# Button poll interval, tightened only briefly around a button change:
+# (seconds since the last button change, poll interval in seconds)
+POLL_INTERVALS = [
+    (0.5, 0.02),   # Just pressed or released, poll fast
+]
+# Idle for longer than the last entry above. The same 50 ms as a fixed poll,
+# so an untouched button never costs more RPC traffic than before.
+POLL_IDLE_INTERVAL_S = 0.05
+
+
+def poll_interval(idle_s):
+    """
+    Return the button poll interval for the time since the last change.
     
-    def __init__(self, port, baudrate=115200, timeout=2):
-        """
-        Initialize RPC client.
-        
-        Args:
-            port: Serial port (e.g., 'COM3' on Windows or '/dev/ttyACM0' on Linux)
-            baudrate: Serial baud rate (default: 115200)
-            timeout: Serial timeout in seconds (default: 2)
-        """
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)  # Allow time for connection to establish
-        # Flush any initial output
-        self.ser.reset_input_buffer()
-        
-    def send_rpc(self, method, params, verbose=True):
-        """
-        Send an RPC request and return the response.
-        
-        Args:
-            method: RPC method name
-            params: Dictionary of parameters
-            verbose: Print request/response (default: True)
-            
-        Returns:
-            Response dictionary or None on error
-        """
-        request = {
-            "method": method,
-            "params": params
-        }
+    Args:
+        idle_s: Seconds since the button state last changed
         
-        request_json = json.dumps(request) + '\r\n'
-        if verbose:
-            print(f"→ {request_json.strip()}")
-        
-        self.ser.write(request_json.encode('utf-8'))
-        
-        # Read response
-        response_line = self.ser.readline().decode('utf-8').strip()
-        if verbose:
-            print(f"← {response_line}")
-        
-        if response_line:
-            try:
-                return json.loads(response_line)
-            except json.JSONDecodeError:
-                print(f"Error: Invalid JSON response: {response_line}")
-                return None
-        return None
-    
-    def close(self):
-        """Close serial connection."""
-        self.ser.close()
+    Returns:
+        Poll interval in seconds
+    """
+    for idle_limit_s, interval_s in POLL_INTERVALS:
+        if idle_s < idle_limit_s:
+            return interval_s
+    return POLL_IDLE_INTERVAL_S
 
 
 def main():
     """Main function."""
-    # Check command line arguments
-    if len(sys.argv) < 2:
-        print("Usage: python gpio_button_mirror.py <COM_PORT>")
-        print("Example: python gpio_button_mirror.py COM3")
-        print("         python gpio_button_mirror.py /dev/ttyACM0")
-        return 1
-    
-    com_port = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Mirror IO13 to IO14 each time the user button (IO16) is pressed",
+        epilog="Example: python gpio_button_mirror.py COM3 (or /dev/ttyACM0)"
+    )
+    parser.add_argument("port", help="Serial port of the DCC_tester")
+    parser.add_argument(
+        "--msgpack",
+        action="store_true",
+        help="Send binary MessagePack requests (needs the msgpack package and MessagePack firmware)"
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Print every RPC request and response (off by default; the loop polls 20-50 times a second)"
+    )
+    args = parser.parse_args()
+    com_port = args.port
+    if args.verbose:
+        set_log_level(2)
     
     print("=" * 70)
     print("GPIO Button Mirror Test")
@@ -96,7 +80,7 @@ def main():
     print(f"Connecting to {com_port}...")
     
     try:
-        rpc = DCCTesterRPC(com_port)
+        rpc = DCCTesterRPC(com_port, use_msgpack=args.msgpack)
     except serial.SerialException as e:
         print(f"ERROR: Could not open {com_port}: {e}")
         return 1
@@ -120,10 +104,11 @@ def main():
         print("Waiting for button press...\n")
         
         button_was_pressed = False
+        last_change = time.monotonic()
         
         while True:
             # Read button state (IO16)
-            response = rpc.send_rpc("get_gpio_input", {"pin": 16}, verbose=False)
+            response = rpc.send_rpc("get_gpio_input", {"pin": 16})
             
             if response is None or response.get("status") != "ok":
                 print(f"WARNING: Failed to read button state: {response}")
@@ -131,27 +116,22 @@ def main():
                 continue
             
             button_pressed = response.get("value", 0) == 1
+            if button_pressed != button_was_pressed:
+                last_change = time.monotonic()
             
             # Detect button press (rising edge)
             if button_pressed and not button_was_pressed:
                 print("→ Button PRESSED!")
                 
-                # Read IO13 input state
-                response = rpc.send_rpc("get_gpio_input", {"pin": 13}, verbose=True)
+                # Read IO13 and set IO14 to match it in one request
+                response = rpc.send_rpc("mirror_gpio", {"src": 13, "dst": 14})
                 
                 if response is None or response.get("status") != "ok":
-                    print(f"ERROR: Failed to read IO13: {response}")
+                    print(f"ERROR: Failed to mirror IO13 to IO14: {response}")
                 else:
                     io13_state = response.get("value", 0)
                     print(f"  IO13 state: {io13_state}")
-                    
-                    # Set IO14 to match IO13
-                    response = rpc.send_rpc("set_gpio_output", {"pin": 14, "state": io13_state}, verbose=True)
-                    
-                    if response is None or response.get("status") != "ok":
-                        print(f"ERROR: Failed to set IO14: {response}")
-                    else:
-                        print(f"  ✓ IO14 set to: {io13_state}")
+                    print(f"  ✓ IO14 set to: {io13_state}")
             
             # Detect button release
             if not button_pressed and button_was_pressed:
@@ -160,8 +140,8 @@ def main():
             
             button_was_pressed = button_pressed
             
-            # Small delay to avoid excessive polling
-            time.sleep(0.05)
+            # Poll fast around button activity and back off while it is idle
+            time.sleep(poll_interval(time.monotonic() - last_change))
     
     except KeyboardInterrupt:
         print("\n\nExiting...")
@@ -6,97 +6,11 @@ AccessoryIOTest Script
 This script tests inter-packet delay timing for accessory IO control.
 """
 
-import json
 import serial
-import time
-from datetime import datetime
+import traceback
 
-
-LOG_LEVEL = 1  # 0 = none, 1 = minimum, 2 = verbose
-
-
-def set_log_level(level):
-    """Set global logging level (0=none, 1=minimum, 2=verbose)."""
-    global LOG_LEVEL
-    try:
-        level_int = int(level)
-    except (TypeError, ValueError):
-        level_int = 1
-    LOG_LEVEL = max(0, min(2, level_int))
-
-
-def log(level, message):
-    if LOG_LEVEL >= level:
-        if LOG_LEVEL == 2:
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-            print(f"[{timestamp}] {message}")
-        else:
-            print(message)
-
-
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-
-    def __init__(self, port, baudrate=115200, timeout=2):
-        """
-        Initialize RPC client.
-
-        Args:
-            port: Serial port (e.g., 'COM3' on Windows or '/dev/ttyACM0' on Linux)
-            baudrate: Serial baud rate (default: 115200)
-            timeout: Serial timeout in seconds (default: 2)
-        """
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)  # Allow time for connection to establish
-
-    def send_rpc(self, method, params):
-        """
-        Send an RPC request and return the response.
-
-        Args:
-            method: RPC method name
-            params: Dictionary of parameters
-
-        Returns:
-            Response dictionary
-        """
-        request = {
-            "method": method,
-            "params": params
-        }
-
-        request_json = json.dumps(request) + '\r\n'
-        log(2, f"→ {request_json.strip()}")
-
-        self.ser.write(request_json.encode('utf-8'))
-
-        # Read response
-        response_line = self.ser.readline().decode('utf-8').strip()
-        log(2, f"← {response_line}")
-
-        if response_line:
-            return json.loads(response_line)
-        return None
-
-    def close(self):
-        """Close serial connection."""
-        self.ser.close()
-
-
-def calculate_dcc_checksum(bytes_list):
-    """
-    Calculate DCC packet checksum (XOR of all bytes).
-
-    Args:
-        bytes_list: List of packet bytes
-
-    Returns:
-        Checksum byte
-    """
-    checksum = 0
-    for byte in bytes_list:
-        checksum ^= byte
-    return checksum
+from dcc_common import (DCCTesterRPC, log, log_enabled, log_lines, precise_sleep_ms,
+                        set_log_level)
 
 
 def _validate_aux_params(address, aux_number):
@@ -106,6 +20,11 @@ def _validate_aux_params(address, aux_number):
         raise ValueError("address must be between 1 and 511 for basic accessory packets")
 
 
+# Basic accessory packets by (address, aux_number, activate). They are kept
+# as bytes so the RPC client can reuse the encoded load request too.
+_ACCESSORY_PACKETS = {}
+
+
 def _make_basic_accessory_packet(address, aux_number, activate):
     """
     Create a basic accessory decoder packet (NMRA S-9.2.1).
@@ -113,27 +32,35 @@ def _make_basic_accessory_packet(address, aux_number, activate):
     address: accessory decoder address (1-511)
     aux_number: output 1-4
     activate: True for ON/closed, False for OFF/thrown
+
+    Returns the packet bytes, including the checksum.
     """
-    _validate_aux_params(address, aux_number)
-
-    # NMRA basic accessory packet:
-    # Byte 1: 10AAAAAA (A0-A5)
-    # Byte 2: 1AAACDDD (A6-A8, C=activate, DDD=output 0-7)
-    # Output 1-4 encoded as 0-3.
-    addr = address - 1
-    output = aux_number - 1
-    byte1 = 0x80 | (addr & 0x3F)
-    byte2 = 0x80 | (((addr >> 6) & 0x07) << 4) | ((1 if activate else 0) << 3) | (output & 0x07)
-    checksum = calculate_dcc_checksum([byte1, byte2])
-    packet = [byte1, byte2, checksum]
-
-    log(2, f"Accessory packet for address {address}, aux {aux_number} ({'ON' if activate else 'OFF'}):")
-    log(2, f"  Bytes: {' '.join(f'0x{b:02X}' for b in packet)}")
-    log(2, "  Binary breakdown:")
-    log(2, f"    Address bits:  {addr:09b} (address {address})")
-    log(2, f"    Byte 1:        0x{byte1:02X}")
-    log(2, f"    Byte 2:        0x{byte2:02X} (activate={'ON' if activate else 'OFF'}, output={aux_number})")
-    log(2, f"    Checksum:      0x{checksum:02X}\n")
+    key = (address, aux_number, activate)
+    packet = _ACCESSORY_PACKETS.get(key)
+    if packet is None:
+        _validate_aux_params(address, aux_number)
+
+        # NMRA basic accessory packet:
+        # Byte 1: 10AAAAAA (A0-A5)
+        # Byte 2: 1AAACDDD (A6-A8, C=activate, DDD=output 0-7)
+        # Output 1-4 encoded as 0-3.
+        addr = address - 1
+        output = aux_number - 1
+        byte1 = 0x80 | (addr & 0x3F)
+        byte2 = 0x80 | (((addr >> 6) & 0x07) << 4) | ((1 if activate else 0) << 3) | (output & 0x07)
+        packet = bytes((byte1, byte2, byte1 ^ byte2))
+        _ACCESSORY_PACKETS[key] = packet
+
+    # The per-byte breakdown is only formatted at the verbose log level
+    if log_enabled(2):
+        byte1, byte2, checksum = packet
+        log(2, f"Accessory packet for address {address}, aux {aux_number} ({'ON' if activate else 'OFF'}):")
+        log(2, f"  Bytes: {packet.hex(' ').upper()}")
+        log(2, "  Binary breakdown:")
+        log(2, f"    Address bits:  {address - 1:09b} (address {address})")
+        log(2, f"    Byte 1:        0x{byte1:02X}")
+        log(2, f"    Byte 2:        0x{byte2:02X} (activate={'ON' if activate else 'OFF'}, output={aux_number})")
+        log(2, f"    Checksum:      0x{checksum:02X}\n")
 
     return packet
 
@@ -167,7 +94,8 @@ def read_aux_io_state(rpc, aux_number):
 
     bit_index = aux_number - 1
     io_high = (gpio_word & (1 << bit_index)) != 0
-    log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO{aux_number}={'HIGH' if io_high else 'LOW'})")
+    if log_enabled(2):
+        log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO{aux_number}={'HIGH' if io_high else 'LOW'})")
     return io_high
 
 
@@ -186,12 +114,13 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
     """
     set_log_level(logging_level)
 
-    log(2, "=" * 70)
-    log(2, "DCC Accessory IO Test")
-    log(2, f"Aux number: {aux_number}")
-    log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
-    log(2, "=" * 70)
-    log(2, "")
+    if log_enabled(2):
+        log(2, "=" * 70)
+        log(2, "DCC Accessory IO Test")
+        log(2, f"Aux number: {aux_number}")
+        log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
+        log(2, "=" * 70)
+        log(2, "")
 
     try:
         # Step 1: Start command station in custom packet mode (loop=0)
@@ -203,7 +132,7 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
             return {"status": "FAIL", "error": "Failed to start command station"}
         log(2, f"✓ Command station started (loop={response.get('loop', 0)})\n")
 
-        time.sleep(0.5)
+        precise_sleep_ms(500)
 
         # Step 2: Create Aux ON packet
         log(1, f"Step 2: Creating Aux ON packet for Aux {aux_number}...")
@@ -211,18 +140,19 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
 
         # Step 3: Load and transmit the Aux ON packet
         log(1, "Step 3: Loading and transmitting Aux ON packet...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": aux_on_packet})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load Aux ON packet: {response}")
+        # The transmit does not depend on the load reply, so send both before
+        # waiting for either reply
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": aux_on_packet}),
+            ("command_station_transmit_packet", {"count": 1, "delay_ms": 0}),
+        ])
+
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load Aux ON packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load Aux ON packet"}
-
-        response = rpc.send_rpc("command_station_transmit_packet",
-                               {"count": 1, "delay_ms": 0})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit Aux ON packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit Aux ON packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit Aux ON packet"}
 
@@ -237,7 +167,7 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
 
         # Step 5: Wait for inter-packet delay
         log(1, f"Step 5: Waiting {inter_packet_delay_ms} ms (inter-packet delay)...")
-        time.sleep(inter_packet_delay_ms / 1000.0)
+        precise_sleep_ms(inter_packet_delay_ms)
         log(2, "✓ Inter-packet delay complete\n")
 
         # Step 6: Create Aux OFF packet
@@ -246,18 +176,17 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
 
         # Step 7: Load and transmit the Aux OFF packet
         log(1, "Step 7: Loading and transmitting Aux OFF packet...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": aux_off_packet})
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": aux_off_packet}),
+            ("command_station_transmit_packet", {"count": 1, "delay_ms": 0}),
+        ])
 
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load Aux OFF packet: {response}")
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load Aux OFF packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load Aux OFF packet"}
-
-        response = rpc.send_rpc("command_station_transmit_packet",
-                       {"count": 1, "delay_ms": 0})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit Aux OFF packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit Aux OFF packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit Aux OFF packet"}
 
@@ -272,42 +201,37 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
 
         # Step 9: Stop command station
         log(1, "Step 9: Stopping command station")
-        response = rpc.send_rpc("command_station_stop", {})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"WARNING: Failed to stop command station: {response}")
-        else:
-            log(2, "✓ Command station stopped\n")
+        rpc.send_fire_and_forget("command_station_stop", {})
 
         test_pass = aux_on_ok and aux_off_ok
 
-        log(2, "\n" + "=" * 70)
-        log(2, "✓ TEST COMPLETE")
-        log(2, "=" * 70)
-        if test_pass:
-            log(2, "✓ TEST PASS")
-        else:
-            log(2, "✗ TEST FAIL")
-        log(2, "=" * 70)
-        log(2, "\nTest Parameters:")
-        log(2, f"  Locomotive address:    {loco_address}")
-        log(2, f"  Aux number:            {aux_number}")
-        log(2, f"  Inter-packet delay:    {inter_packet_delay_ms} ms")
-        log(2, "\nTest sequence completed:")
-        log(2, "  1. Started command station in custom packet mode")
-        log(2, f"  2. Created Aux ON packet for Aux {aux_number}")
-        log(2, f"  3. Transmitted Aux ON packet to address {loco_address}")
-        log(2, f"  4. Read IO{aux_number} after Aux ON: {aux_on_ok}")
-        log(2, f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)")
-        log(2, f"  6. Created Aux OFF packet for Aux {aux_number}")
-        log(2, f"  7. Transmitted Aux OFF packet to address {loco_address}")
-        log(2, f"  8. Read IO{aux_number} after Aux OFF: {aux_off_ok}")
-        log(2, "  9. Stopped command station")
-        log(2, "\nIO state measurements:")
-        log(2, f"  Aux ON IO match:  {aux_on_ok}")
-        log(2, f"  Aux OFF IO match: {aux_off_ok}")
-        log(2, "\nPass Criteria:")
-        log(2, "  Aux ON read is HIGH and Aux OFF read is LOW")
+        if log_enabled(2):
+            log_lines(2, [
+                "\n" + "=" * 70,
+                "✓ TEST COMPLETE",
+                "=" * 70,
+                "✓ TEST PASS" if test_pass else "✗ TEST FAIL",
+                "=" * 70,
+                "\nTest Parameters:",
+                f"  Locomotive address:    {loco_address}",
+                f"  Aux number:            {aux_number}",
+                f"  Inter-packet delay:    {inter_packet_delay_ms} ms",
+                "\nTest sequence completed:",
+                "  1. Started command station in custom packet mode",
+                f"  2. Created Aux ON packet for Aux {aux_number}",
+                f"  3. Transmitted Aux ON packet to address {loco_address}",
+                f"  4. Read IO{aux_number} after Aux ON: {aux_on_ok}",
+                f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)",
+                f"  6. Created Aux OFF packet for Aux {aux_number}",
+                f"  7. Transmitted Aux OFF packet to address {loco_address}",
+                f"  8. Read IO{aux_number} after Aux OFF: {aux_off_ok}",
+                "  9. Stopped command station",
+                "\nIO state measurements:",
+                f"  Aux ON IO match:  {aux_on_ok}",
+                f"  Aux OFF IO match: {aux_off_ok}",
+                "\nPass Criteria:",
+                "  Aux ON read is HIGH and Aux OFF read is LOW",
+            ])
         log(1, "")
 
         return {
@@ -328,6 +252,6 @@ def run_aux_io_test(rpc, loco_address, aux_number, inter_packet_delay_ms=1000, l
         return {"status": "FAIL", "error": "Test interrupted by user"}
     except Exception as e:
         log(1, f"\nERROR: Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        if log_enabled(2):
+            log(2, traceback.format_exc())
         return {"status": "FAIL", "error": f"Unexpected error: {e}"}
@@ -15,122 +15,11 @@ speed, checksum). Mask bit 31 targets the MSB of the address byte; mask bit 0
 targets the LSB of the checksum byte.
 """
 
-import json
 import serial
-import time
-from datetime import datetime
+import traceback
 
-
-LOG_LEVEL = 1  # 0 = none, 1 = minimum, 2 = verbose
-
-
-def set_log_level(level):
-    """Set global logging level (0=none, 1=minimum, 2=verbose)."""
-    global LOG_LEVEL
-    try:
-        level_int = int(level)
-    except (TypeError, ValueError):
-        level_int = 1
-    LOG_LEVEL = max(0, min(2, level_int))
-
-
-def log(level, message):
-    if LOG_LEVEL >= level:
-        if LOG_LEVEL == 2:
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-            print(f"[{timestamp}] {message}")
-        else:
-            print(message)
-
-
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-
-    def __init__(self, port, baudrate=115200, timeout=2):
-        """
-        Initialize RPC client.
-
-        Args:
-            port: Serial port (e.g., 'COM3' on Windows or '/dev/ttyACM0' on Linux)
-            baudrate: Serial baud rate (default: 115200)
-            timeout: Serial timeout in seconds (default: 2)
-        """
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)  # Allow time for connection to establish
-
-    def send_rpc(self, method, params):
-        """
-        Send an RPC request and return the response.
-
-        Args:
-            method: RPC method name
-            params: Dictionary of parameters
-
-        Returns:
-            Response dictionary
-        """
-        request = {
-            "method": method,
-            "params": params
-        }
-
-        request_json = json.dumps(request) + "\r\n"
-        log(2, f"→ {request_json.strip()}")
-
-        self.ser.write(request_json.encode("utf-8"))
-
-        response_line = self.ser.readline().decode("utf-8").strip()
-        log(2, f"← {response_line}")
-
-        if response_line:
-            return json.loads(response_line)
-        return None
-
-    def close(self):
-        """Close serial connection."""
-        self.ser.close()
-
-
-def calculate_dcc_checksum(bytes_list):
-    """Calculate DCC packet checksum (XOR of all bytes)."""
-    checksum = 0
-    for byte in bytes_list:
-        checksum ^= byte
-    return checksum
-
-
-def make_speed_packet(address, speed, forward=True):
-    """
-    Create a DCC advanced operations speed packet (128-speed step mode).
-
-    Args:
-        address: Locomotive address (0-127 for short address)
-        speed: Speed value (0-127, where 0=stop, 1=emergency stop, 2-127=speed steps)
-        forward: True for forward, False for reverse
-
-    Returns:
-        List of packet bytes
-    """
-    instruction = 0x3F
-
-    if forward:
-        speed_byte = (1 << 7) | (speed & 0x7F)
-    else:
-        speed_byte = speed & 0x7F
-
-    packet = [address, instruction, speed_byte]
-    checksum = calculate_dcc_checksum(packet)
-    packet.append(checksum)
-
-    log(2, f"Packet for address {address}, speed {speed} {'forward' if forward else 'reverse'}:")
-    log(2, f"  Bytes: {' '.join(f'0x{b:02X}' for b in packet)}")
-    log(2, "  Binary breakdown:")
-    log(2, f"    Address:     0x{packet[0]:02X} ({packet[0]})")
-    log(2, f"    Instruction: 0x{packet[1]:02X} (advanced operations speed)")
-    log(2, f"    Speed:       0x{packet[2]:02X} (dir={'forward' if forward else 'reverse'}, speed={speed})")
-    log(2, f"    Checksum:    0x{packet[3]:02X}\n")
-
-    return packet
+from dcc_common import (DCCTesterRPC, log, log_enabled, log_lines, make_speed_packet,
+                        precise_sleep_ms, set_log_level)
 
 
 def make_stop_packet(address):
@@ -141,7 +30,7 @@ def make_stop_packet(address):
         address: Locomotive address
 
     Returns:
-        List of packet bytes
+        Packet bytes
     """
     return make_speed_packet(address, 0, forward=True)
 
@@ -150,15 +39,14 @@ def apply_flip_mask(packet, flip_mask):
     if flip_mask < 0 or flip_mask > 0xFFFFFFFF:
         raise ValueError("flip_mask must be a 32-bit unsigned value")
 
-    flipped = packet[:]
-    for bit_index in range(32):
-        if (flip_mask >> bit_index) & 0x1:
-            byte_index = (31 - bit_index) // 8
-            if byte_index >= len(flipped):
-                break
-            bit_in_byte = bit_index % 8
-            flipped[byte_index] ^= (1 << bit_in_byte)
-    return flipped
+    # The mask is a big-endian 32-bit value over the first 4 packet bytes,
+    # so flipping is a single XOR; a shorter packet takes the mask's top bytes
+    flipped = bytearray(packet)
+    length = min(len(flipped), 4)
+    if length:
+        value = int.from_bytes(flipped[:length], "big") ^ (flip_mask >> (8 * (4 - length)))
+        flipped[:length] = value.to_bytes(length, "big")
+    return bytes(flipped)
 
 
 def read_io13_io14(rpc):
@@ -181,7 +69,8 @@ def read_io13_io14(rpc):
     io13_high = (gpio_word & (1 << 12)) != 0
     io14_high = (gpio_word & (1 << 13)) != 0
 
-    log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO13={'HIGH' if io13_high else 'LOW'}, IO14={'HIGH' if io14_high else 'LOW'})")
+    if log_enabled(2):
+        log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO13={'HIGH' if io13_high else 'LOW'}, IO14={'HIGH' if io14_high else 'LOW'})")
     return io13_high, io14_high
 
 
@@ -218,12 +107,13 @@ def run_bad_bit_test(
 
     set_log_level(logging_level)
 
-    log(2, "=" * 70)
-    log(2, "DCC Bad Bit Test")
-    log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
-    log(2, f"Feedback mode: {'current' if in_circuit_motor else 'voltage'}")
-    log(2, "=" * 70)
-    log(2, "")
+    if log_enabled(2):
+        log(2, "=" * 70)
+        log(2, "DCC Bad Bit Test")
+        log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
+        log(2, f"Feedback mode: {'current' if in_circuit_motor else 'voltage'}")
+        log(2, "=" * 70)
+        log(2, "")
 
     try:
         log(1, "Step 1: Starting command station in custom packet mode")
@@ -234,7 +124,7 @@ def run_bad_bit_test(
             return {"status": "FAIL", "error": "Failed to start command station"}
         log(2, f"✓ Command station started (loop={response.get('loop', 0)})\n")
 
-        time.sleep(0.5)
+        precise_sleep_ms(500)
 
         if in_circuit_motor:
             log(1, "Step 2: Reading motor off current as baseline...")
@@ -255,24 +145,27 @@ def run_bad_bit_test(
 
         log(1, f"Step 3: Creating motor start packet (speed {HALF_SPEED} reverse)...")
         start_packet = make_speed_packet(loco_address, HALF_SPEED, forward=False)
+        log(2, f"Start packet: {start_packet.hex(' ').upper()}")
 
         log(1, "Step 4: Loading and transmitting motor start packet...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": start_packet, "replace": True})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load packet: {response}")
+        # The transmit does not depend on the load reply, so send both before
+        # waiting for either reply
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": start_packet, "replace": True}),
+            ("command_station_transmit_packet", {"delay_ms": 0}),
+        ])
+
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load packet"}
-
-        response = rpc.send_rpc("command_station_transmit_packet", {"delay_ms": 0})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit packet"}
 
         log(1, f"Step 5: Waiting {inter_packet_delay_ms} ms (inter-packet delay)...")
-        time.sleep(inter_packet_delay_ms / 1000.0)
+        precise_sleep_ms(inter_packet_delay_ms)
         log(2, "✓ Inter-packet delay complete\n")
 
         if in_circuit_motor:
@@ -294,24 +187,28 @@ def run_bad_bit_test(
 
         log(1, f"Step 7: Sending directed stop packet to address {loco_address}...")
         stop_packet = make_stop_packet(loco_address)
+        log(2, f"Stop packet: {stop_packet.hex(' ').upper()}")
         stop_packet = apply_flip_mask(stop_packet, flip_mask)
         if flip_mask:
             log(1, f"Applied flip mask 0x{flip_mask:08X} to stop packet")
 
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": stop_packet, "replace": True})
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load stop packet: {response}")
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": stop_packet, "replace": True}),
+            ("command_station_transmit_packet", {"delay_ms": 0}),
+        ])
+
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load stop packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load stop packet"}
         log(2, "✓ Stop packet loaded\n")
-        response = rpc.send_rpc("command_station_transmit_packet", {"delay_ms": 0})
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit stop packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit stop packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit stop"}
 
         log(2, f"Step 8: Waiting {test_stop_delay_ms} ms for motor to stop...")
-        time.sleep(test_stop_delay_ms / 1000.0)
+        precise_sleep_ms(test_stop_delay_ms)
 
         if in_circuit_motor:
             log(1, "Step 9: Reading motor stopped current...")
@@ -331,12 +228,7 @@ def run_bad_bit_test(
             log(1, f"✓ Motor stopped IO state: {motor_stop_ok} (IO13={'HIGH' if io13_high else 'LOW'}, IO14={'HIGH' if io14_high else 'LOW'})")
 
         log(1, "Step 10: Stopping command station")
-        response = rpc.send_rpc("command_station_stop", {})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"WARNING: Failed to stop command station: {response}")
-        else:
-            log(2, "✓ Command station stopped\n")
+        rpc.send_fire_and_forget("command_station_stop", {})
 
         if in_circuit_motor:
             current_increase = motor_on_current_ma - motor_off_current_ma
@@ -347,36 +239,36 @@ def run_bad_bit_test(
             motor_stopped_ok = current_decrease >= min_current_delta_ma
             log(1, f"Step 11: Motor stopped: {'YES' if motor_stopped_ok else 'NO'}")
 
-            log(2, "\n" + "=" * 70)
-            log(2, "✓ TEST COMPLETE")
-            log(2, "=" * 70)
-            if test_pass:
-                log(2, "✓ TEST PASS")
-            else:
-                log(2, "✗ TEST FAIL")
-            log(2, "=" * 70)
-            log(2, "\nTest Parameters:")
-            log(2, f"  Locomotive address:    {loco_address}")
-            log(2, f"  Motor speed:           {HALF_SPEED} (reverse)")
-            log(2, f"  Inter-packet delay:    {inter_packet_delay_ms} ms")
-            log(2, "\nTest sequence completed:")
-            log(2, "  1. Started command station in custom packet mode")
-            log(2, f"  2. Read motor off current: {motor_off_current_ma} mA (baseline)")
-            log(2, f"  3. Created motor start packet (speed {HALF_SPEED} reverse)")
-            log(2, f"  4. Transmitted motor start packet to address {loco_address}")
-            log(2, f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)")
-            log(2, f"  6. Read motor run current: {motor_on_current_ma} mA")
-            log(2, f"  7. Sent directed stop packet to address {loco_address}")
-            log(2, "  8. Waited 1 second for motor to stop")
-            log(2, f"  9. Read motor stopped current: {motor_stopped_current_ma} mA")
-            log(2, "  10. Stopped command station")
-            log(2, "\nCurrent measurements:")
-            log(2, f"  Motor off:     {motor_off_current_ma} mA (baseline)")
-            log(2, f"  Motor running: {motor_on_current_ma} mA (delta: {current_increase:+d} mA)")
-            log(2, f"  Motor stopped: {motor_stopped_current_ma} mA (delta from baseline: {motor_stopped_current_ma - motor_off_current_ma:+d} mA)")
-            log(2, f"\nPass Criteria (minimum delta: {min_current_delta_ma} mA):")
-            log(2, f"  Current increased during run: {current_increase >= min_current_delta_ma} ({current_increase:+d} mA >= {min_current_delta_ma} mA)")
-            log(2, f"  Current decreased after stop: {current_decrease >= min_current_delta_ma} ({current_decrease:+d} mA >= {min_current_delta_ma} mA)")
+            if log_enabled(2):
+                log_lines(2, [
+                    "\n" + "=" * 70,
+                    "✓ TEST COMPLETE",
+                    "=" * 70,
+                    "✓ TEST PASS" if test_pass else "✗ TEST FAIL",
+                    "=" * 70,
+                    "\nTest Parameters:",
+                    f"  Locomotive address:    {loco_address}",
+                    f"  Motor speed:           {HALF_SPEED} (reverse)",
+                    f"  Inter-packet delay:    {inter_packet_delay_ms} ms",
+                    "\nTest sequence completed:",
+                    "  1. Started command station in custom packet mode",
+                    f"  2. Read motor off current: {motor_off_current_ma} mA (baseline)",
+                    f"  3. Created motor start packet (speed {HALF_SPEED} reverse)",
+                    f"  4. Transmitted motor start packet to address {loco_address}",
+                    f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)",
+                    f"  6. Read motor run current: {motor_on_current_ma} mA",
+                    f"  7. Sent directed stop packet to address {loco_address}",
+                    "  8. Waited 1 second for motor to stop",
+                    f"  9. Read motor stopped current: {motor_stopped_current_ma} mA",
+                    "  10. Stopped command station",
+                    "\nCurrent measurements:",
+                    f"  Motor off:     {motor_off_current_ma} mA (baseline)",
+                    f"  Motor running: {motor_on_current_ma} mA (delta: {current_increase:+d} mA)",
+                    f"  Motor stopped: {motor_stopped_current_ma} mA (delta from baseline: {motor_stopped_current_ma - motor_off_current_ma:+d} mA)",
+                    f"\nPass Criteria (minimum delta: {min_current_delta_ma} mA):",
+                    f"  Current increased during run: {current_increase >= min_current_delta_ma} ({current_increase:+d} mA >= {min_current_delta_ma} mA)",
+                    f"  Current decreased after stop: {current_decrease >= min_current_delta_ma} ({current_decrease:+d} mA >= {min_current_delta_ma} mA)",
+                ])
             log(1, "")
 
             return {
@@ -393,35 +285,35 @@ def run_bad_bit_test(
 
         log(1, f"Step 11: Motor stopped: {'YES' if motor_stop_ok else 'NO'}")
 
-        log(2, "\n" + "=" * 70)
-        log(2, "✓ TEST COMPLETE")
-        log(2, "=" * 70)
-        if test_pass:
-            log(2, "✓ TEST PASS")
-        else:
-            log(2, "✗ TEST FAIL")
-        log(2, "=" * 70)
-        log(2, "\nTest Parameters:")
-        log(2, f"  Locomotive address:    {loco_address}")
-        log(2, f"  Motor speed:           {HALF_SPEED} (reverse)")
-        log(2, f"  Inter-packet delay:    {inter_packet_delay_ms} ms")
-        log(2, "\nTest sequence completed:")
-        log(2, "  1. Started command station in custom packet mode")
-        log(2, f"  2. Read motor off IO state: {motor_off_ok}")
-        log(2, f"  3. Created motor start packet (speed {HALF_SPEED} reverse)")
-        log(2, f"  4. Transmitted motor start packet to address {loco_address}")
-        log(2, f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)")
-        log(2, f"  6. Read motor run IO state: {motor_run_ok}")
-        log(2, f"  7. Sent directed stop packet to address {loco_address}")
-        log(2, "  8. Waited 1 second for motor to stop")
-        log(2, f"  9. Read motor stopped IO state: {motor_stop_ok}")
-        log(2, "  10. Stopped command station")
-        log(2, "\nIO state measurements:")
-        log(2, f"  Motor off OK:  {motor_off_ok}")
-        log(2, f"  Motor run OK:  {motor_run_ok}")
-        log(2, f"  Motor stop OK: {motor_stop_ok}")
-        log(2, "\nPass Criteria:")
-        log(2, "  Off, Run, Stop states are all True")
+        if log_enabled(2):
+            log_lines(2, [
+                "\n" + "=" * 70,
+                "✓ TEST COMPLETE",
+                "=" * 70,
+                "✓ TEST PASS" if test_pass else "✗ TEST FAIL",
+                "=" * 70,
+                "\nTest Parameters:",
+                f"  Locomotive address:    {loco_address}",
+                f"  Motor speed:           {HALF_SPEED} (reverse)",
+                f"  Inter-packet delay:    {inter_packet_delay_ms} ms",
+                "\nTest sequence completed:",
+                "  1. Started command station in custom packet mode",
+                f"  2. Read motor off IO state: {motor_off_ok}",
+                f"  3. Created motor start packet (speed {HALF_SPEED} reverse)",
+                f"  4. Transmitted motor start packet to address {loco_address}",
+                f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)",
+                f"  6. Read motor run IO state: {motor_run_ok}",
+                f"  7. Sent directed stop packet to address {loco_address}",
+                "  8. Waited 1 second for motor to stop",
+                f"  9. Read motor stopped IO state: {motor_stop_ok}",
+                "  10. Stopped command station",
+                "\nIO state measurements:",
+                f"  Motor off OK:  {motor_off_ok}",
+                f"  Motor run OK:  {motor_run_ok}",
+                f"  Motor stop OK: {motor_stop_ok}",
+                "\nPass Criteria:",
+                "  Off, Run, Stop states are all True",
+            ])
         log(1, "")
 
         return {
@@ -440,6 +332,6 @@ def run_bad_bit_test(
         return {"status": "FAIL", "error": "Test interrupted by user"}
     except Exception as e:
         log(1, f"\nERROR: Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        if log_enabled(2):
+            log(2, traceback.format_exc())
         return {"status": "FAIL", "error": f"Unexpected error: {e}"}
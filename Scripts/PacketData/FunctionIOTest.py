@@ -7,68 +7,11 @@ This script tests inter-packet delay timing for locomotive function IO control.
 Implements Function Group 1 (F1-F4) packets.
 """
 
-import json
 import serial
-import time
-from datetime import datetime
+import traceback
 
-
-LOG_LEVEL = 1  # 0 = none, 1 = minimum, 2 = verbose
-
-
-def set_log_level(level):
-    """Set global logging level (0=none, 1=minimum, 2=verbose)."""
-    global LOG_LEVEL
-    try:
-        level_int = int(level)
-    except (TypeError, ValueError):
-        level_int = 1
-    LOG_LEVEL = max(0, min(2, level_int))
-
-
-def log(level, message):
-    if LOG_LEVEL >= level:
-        if LOG_LEVEL == 2:
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-            print(f"[{timestamp}] {message}")
-        else:
-            print(message)
-
-
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-
-    def __init__(self, port, baudrate=115200, timeout=2):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)
-
-    def send_rpc(self, method, params):
-        request = {
-            "method": method,
-            "params": params
-        }
-
-        request_json = json.dumps(request) + '\r\n'
-        log(2, f"→ {request_json.strip()}")
-        self.ser.write(request_json.encode('utf-8'))
-
-        response_line = self.ser.readline().decode('utf-8').strip()
-        log(2, f"← {response_line}")
-
-        if response_line:
-            return json.loads(response_line)
-        return None
-
-    def close(self):
-        self.ser.close()
-
-
-def calculate_dcc_checksum(bytes_list):
-    """Calculate DCC packet checksum (XOR of all bytes)."""
-    checksum = 0
-    for byte in bytes_list:
-        checksum ^= byte
-    return checksum
+from dcc_common import (DCCTesterRPC, log, log_enabled, log_lines, precise_sleep_ms,
+                        set_log_level)
 
 
 def _validate_function_params(address, function_number):
@@ -78,43 +21,47 @@ def _validate_function_params(address, function_number):
         raise ValueError("address must be between 1 and 127 for short addresses")
 
 
-def _function_group1_mask(function_number):
-    # Function Group 1: 0x80 + F1..F4 bits
-    return {
-        1: 0x01,  # F1
-        2: 0x02,  # F2
-        3: 0x04,  # F3
-        4: 0x08,  # F4
-    }[function_number]
+# Function Group 1 packets by (address, function_number, on)
+_FUNCTION_PACKETS = {}
 
 
 def make_function_on_packet(address, function_number):
     """Create a Function Group 1 packet turning a single function ON."""
-    _validate_function_params(address, function_number)
-    instruction = 0x80 | _function_group1_mask(function_number)
-    packet = [address, instruction]
-    checksum = calculate_dcc_checksum(packet)
-    packet.append(checksum)
-
-    log(2, f"Function ON packet for address {address}, F{function_number}:")
-    log(2, f"  Bytes: {' '.join(f'0x{b:02X}' for b in packet)}")
-    log(2, f"  Instruction: 0x{instruction:02X} (Group 1, F{function_number}=ON)")
-    log(2, f"  Checksum:    0x{checksum:02X}\n")
+    key = (address, function_number, True)
+    packet = _FUNCTION_PACKETS.get(key)
+    if packet is None:
+        _validate_function_params(address, function_number)
+        # Function Group 1: 0x80 + F1..F4 in bits 0-3
+        instruction = 0x80 | (1 << (function_number - 1))
+        packet = bytes((address, instruction, address ^ instruction))
+        _FUNCTION_PACKETS[key] = packet
+
+    # The per-byte breakdown is only formatted at the verbose log level
+    if log_enabled(2):
+        _, instruction, checksum = packet
+        log(2, f"Function ON packet for address {address}, F{function_number}:")
+        log(2, f"  Bytes: {packet.hex(' ').upper()}")
+        log(2, f"  Instruction: 0x{instruction:02X} (Group 1, F{function_number}=ON)")
+        log(2, f"  Checksum:    0x{checksum:02X}\n")
     return packet
 
 
 def make_function_off_packet(address, function_number):
     """Create a Function Group 1 packet turning a single function OFF."""
-    _validate_function_params(address, function_number)
-    instruction = 0x80  # Group 1 with all functions off
-    packet = [address, instruction]
-    checksum = calculate_dcc_checksum(packet)
-    packet.append(checksum)
-
-    log(2, f"Function OFF packet for address {address}, F{function_number}:")
-    log(2, f"  Bytes: {' '.join(f'0x{b:02X}' for b in packet)}")
-    log(2, f"  Instruction: 0x{instruction:02X} (Group 1, F{function_number}=OFF)")
-    log(2, f"  Checksum:    0x{checksum:02X}\n")
+    key = (address, function_number, False)
+    packet = _FUNCTION_PACKETS.get(key)
+    if packet is None:
+        _validate_function_params(address, function_number)
+        instruction = 0x80  # Group 1 with all functions off
+        packet = bytes((address, instruction, address ^ instruction))
+        _FUNCTION_PACKETS[key] = packet
+
+    if log_enabled(2):
+        _, instruction, checksum = packet
+        log(2, f"Function OFF packet for address {address}, F{function_number}:")
+        log(2, f"  Bytes: {packet.hex(' ').upper()}")
+        log(2, f"  Instruction: 0x{instruction:02X} (Group 1, F{function_number}=OFF)")
+        log(2, f"  Checksum:    0x{checksum:02X}\n")
     return packet
 
 
@@ -137,7 +84,8 @@ def read_function_io_state(rpc, function_number):
 
     bit_index = function_number - 1
     io_high = (gpio_word & (1 << bit_index)) != 0
-    log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO{function_number}={'HIGH' if io_high else 'LOW'})")
+    if log_enabled(2):
+        log(2, f"GPIO inputs: 0x{gpio_word:04X} (IO{function_number}={'HIGH' if io_high else 'LOW'})")
     return not io_high
 
 
@@ -145,12 +93,13 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
     """Run the Function IO test for F1-F4."""
     set_log_level(logging_level)
 
-    log(2, "=" * 70)
-    log(2, "DCC Function IO Test (F1-F4)")
-    log(2, f"Function number: F{function_number}")
-    log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
-    log(2, "=" * 70)
-    log(2, "")
+    if log_enabled(2):
+        log(2, "=" * 70)
+        log(2, "DCC Function IO Test (F1-F4)")
+        log(2, f"Function number: F{function_number}")
+        log(2, f"Inter-packet delay: {inter_packet_delay_ms} ms")
+        log(2, "=" * 70)
+        log(2, "")
 
     try:
         # Step 1: Start command station in custom packet mode (loop=0)
@@ -162,7 +111,7 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
             return {"status": "FAIL", "error": "Failed to start command station"}
         log(2, f"✓ Command station started (loop={response.get('loop', 0)})\n")
 
-        time.sleep(0.5)
+        precise_sleep_ms(500)
 
         # Step 2: Create Function ON packet
         log(1, f"Step 2: Creating Function ON packet for F{function_number}...")
@@ -170,18 +119,19 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
 
         # Step 3: Load and transmit the Function ON packet
         log(1, "Step 3: Loading and transmitting Function ON packet...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": func_on_packet})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load Function ON packet: {response}")
+        # The transmit does not depend on the load reply, so send both before
+        # waiting for either reply
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": func_on_packet}),
+            ("command_station_transmit_packet", {"count": 1, "delay_ms": 0}),
+        ])
+
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load Function ON packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load Function ON packet"}
-
-        response = rpc.send_rpc("command_station_transmit_packet",
-                               {"count": 1, "delay_ms": 0})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit Function ON packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit Function ON packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit Function ON packet"}
 
@@ -196,7 +146,7 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
 
         # Step 5: Wait for inter-packet delay
         log(1, f"Step 5: Waiting {inter_packet_delay_ms} ms (inter-packet delay)...")
-        time.sleep(inter_packet_delay_ms / 1000.0)
+        precise_sleep_ms(inter_packet_delay_ms)
         log(2, "✓ Inter-packet delay complete\n")
 
         # Step 6: Create Function OFF packet
@@ -205,18 +155,17 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
 
         # Step 7: Load and transmit the Function OFF packet
         log(1, "Step 7: Loading and transmitting Function OFF packet...")
-        response = rpc.send_rpc("command_station_load_packet", {"bytes": func_off_packet})
+        load_response, transmit_response = rpc.send_rpc_batch([
+            ("command_station_load_packet", {"bytes": func_off_packet}),
+            ("command_station_transmit_packet", {"count": 1, "delay_ms": 0}),
+        ])
 
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to load Function OFF packet: {response}")
+        if load_response is None or load_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to load Function OFF packet: {load_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to load Function OFF packet"}
-
-        response = rpc.send_rpc("command_station_transmit_packet",
-                               {"count": 1, "delay_ms": 0})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"ERROR: Failed to transmit Function OFF packet: {response}")
+        if transmit_response is None or transmit_response.get("status") != "ok":
+            log(1, f"ERROR: Failed to transmit Function OFF packet: {transmit_response}")
             rpc.close()
             return {"status": "FAIL", "error": "Failed to transmit Function OFF packet"}
 
@@ -231,42 +180,37 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
 
         # Step 9: Stop command station
         log(1, "Step 9: Stopping command station")
-        response = rpc.send_rpc("command_station_stop", {})
-
-        if response is None or response.get("status") != "ok":
-            log(1, f"WARNING: Failed to stop command station: {response}")
-        else:
-            log(2, "✓ Command station stopped\n")
+        rpc.send_fire_and_forget("command_station_stop", {})
 
         test_pass = func_on_ok and func_off_ok
 
-        log(2, "\n" + "=" * 70)
-        log(2, "✓ TEST COMPLETE")
-        log(2, "=" * 70)
-        if test_pass:
-            log(2, "✓ TEST PASS")
-        else:
-            log(2, "✗ TEST FAIL")
-        log(2, "=" * 70)
-        log(2, "\nTest Parameters:")
-        log(2, f"  Locomotive address:    {loco_address}")
-        log(2, f"  Function number:       F{function_number}")
-        log(2, f"  Inter-packet delay:    {inter_packet_delay_ms} ms")
-        log(2, "\nTest sequence completed:")
-        log(2, "  1. Started command station in custom packet mode")
-        log(2, f"  2. Created Function ON packet for F{function_number}")
-        log(2, f"  3. Transmitted Function ON packet to address {loco_address}")
-        log(2, f"  4. Read IO{function_number} after Function ON: {func_on_ok}")
-        log(2, f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)")
-        log(2, f"  6. Created Function OFF packet for F{function_number}")
-        log(2, f"  7. Transmitted Function OFF packet to address {loco_address}")
-        log(2, f"  8. Read IO{function_number} after Function OFF: {func_off_ok}")
-        log(2, "  9. Stopped command station")
-        log(2, "\nIO state measurements:")
-        log(2, f"  Function ON IO match:  {func_on_ok}")
-        log(2, f"  Function OFF IO match: {func_off_ok}")
-        log(2, "\nPass Criteria:")
-        log(2, "  Function ON read is HIGH and Function OFF read is LOW")
+        if log_enabled(2):
+            log_lines(2, [
+                "\n" + "=" * 70,
+                "✓ TEST COMPLETE",
+                "=" * 70,
+                "✓ TEST PASS" if test_pass else "✗ TEST FAIL",
+                "=" * 70,
+                "\nTest Parameters:",
+                f"  Locomotive address:    {loco_address}",
+                f"  Function number:       F{function_number}",
+                f"  Inter-packet delay:    {inter_packet_delay_ms} ms",
+                "\nTest sequence completed:",
+                "  1. Started command station in custom packet mode",
+                f"  2. Created Function ON packet for F{function_number}",
+                f"  3. Transmitted Function ON packet to address {loco_address}",
+                f"  4. Read IO{function_number} after Function ON: {func_on_ok}",
+                f"  5. Waited {inter_packet_delay_ms} ms (inter-packet delay)",
+                f"  6. Created Function OFF packet for F{function_number}",
+                f"  7. Transmitted Function OFF packet to address {loco_address}",
+                f"  8. Read IO{function_number} after Function OFF: {func_off_ok}",
+                "  9. Stopped command station",
+                "\nIO state measurements:",
+                f"  Function ON IO match:  {func_on_ok}",
+                f"  Function OFF IO match: {func_off_ok}",
+                "\nPass Criteria:",
+                "  Function ON read is HIGH and Function OFF read is LOW",
+            ])
         log(1, "")
 
         return {
@@ -284,6 +228,6 @@ def run_function_io_test(rpc, loco_address, function_number, inter_packet_delay_
         return {"status": "FAIL", "error": "Test interrupted by user"}
     except Exception as e:
         log(1, f"\nERROR: Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        if log_enabled(2):
+            log(2, traceback.format_exc())
         return {"status": "FAIL", "error": f"Unexpected error: {e}"}
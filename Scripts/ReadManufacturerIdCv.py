@@ -7,61 +7,12 @@ Best-effort read of CV8 (manufacturer ID) using service mode direct bit verify
 packets and current feedback for ACK detection.
 """
 
-import json
 import os
 import sys
 import time
 import serial
-from datetime import datetime
 
-LOG_LEVEL = 1  # 0 = none, 1 = minimum, 2 = verbose
-
-
-def set_log_level(level):
-    """Set global logging level (0=none, 1=minimum, 2=verbose)."""
-    global LOG_LEVEL
-    try:
-        level_int = int(level)
-    except (TypeError, ValueError):
-        level_int = 1
-    LOG_LEVEL = max(0, min(2, level_int))
-
-
-def log(level, message):
-    if LOG_LEVEL >= level:
-        if LOG_LEVEL == 2:
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-            print(f"[{timestamp}] {message}")
-        else:
-            print(message)
-
-
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-
-    def __init__(self, port, baudrate=115200, timeout=2):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)
-
-    def send_rpc(self, method, params, quiet=False):
-        request = {
-            "method": method,
-            "params": params,
-        }
-        request_json = json.dumps(request) + "\r\n"
-        if not quiet:
-            log(2, f"→ {request_json.strip()}")
-        self.ser.write(request_json.encode("utf-8"))
-
-        response_line = self.ser.readline().decode("utf-8").strip()
-        if not quiet:
-            log(2, f"← {response_line}")
-        if response_line:
-            return json.loads(response_line)
-        return None
-
-    def close(self):
-        self.ser.close()
+from dcc_common import DCCTesterRPC, calculate_dcc_checksum, log, set_log_level
 
 
 def _parse_int(value, key):
@@ -116,13 +67,6 @@ def load_config(config_path):
     }
 
 
-def calculate_dcc_checksum(bytes_list):
-    checksum = 0
-    for byte in bytes_list:
-        checksum ^= byte
-    return checksum
-
-
 def make_direct_bit_verify_packet(cv_number, bit_index, bit_value):
     if cv_number < 1 or cv_number > 1024:
         raise ValueError("cv_number must be in range 1-1024")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+RunAcceptanceTestPacket Script
+==============================
+
+This script runs AcceptanceTestPacket and/or AcceptanceTestPacketAllStop
+over a single serial connection.
+
+Opening the USB CDC ACM port is the slowest part of a short test, so the
+port is opened once and shared by every test and every pass.
+
+The serial port is taken from SystemConfig.txt.
+
+Usage:
+    python RunAcceptanceTestPacket.py                  # both tests, one pass
+    python RunAcceptanceTestPacket.py allstop -n 5     # broadcast test, 5 passes
+"""
+
+import argparse
+import sys
+import os
+import serial
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Import system configuration
+sys.path.insert(0, script_dir)
+import System
+from dcc_common import DCCTesterRPC, RPCError, buffered_output, set_log_level
+import AcceptanceTestPacket
+import AcceptanceTestPacketAllStop
+
+TESTS = {
+    "packet": AcceptanceTestPacket.run_acceptance_test,
+    "allstop": AcceptanceTestPacketAllStop.run_acceptance_test_allstop,
+}
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Run the acceptance packet tests over one serial connection"
+    )
+    parser.add_argument(
+        "tests",
+        nargs="*",
+        metavar="TEST",
+        help="Tests to run in order: packet, allstop (default: both)"
+    )
+    parser.add_argument(
+        "-n", "--passes",
+        type=int,
+        default=1,
+        help="Number of times to run the test list (default: 1)"
+    )
+    args = parser.parse_args()
+    tests = args.tests or ["packet", "allstop"]
+    unknown = [name for name in tests if name not in TESTS]
+    if unknown:
+        parser.error(f"unknown test(s): {', '.join(unknown)}")
+
+    sys_config = System.get_config()
+    port = sys_config.serial_port
+    set_log_level(sys_config.logging_level)
+
+    passed_count = 0
+    failed_count = 0
+    error_count = 0
+
+    try:
+        # Connect to DCC_tester once for all tests
+        print(f"Connecting to {port}...")
+        rpc = DCCTesterRPC(port, use_msgpack=sys_config.use_msgpack)
+        print("Connected!\n")
+
+        for i in range(1, args.passes + 1):
+            for name in tests:
+                print(f"Pass {i} of {args.passes}: {name}")
+                try:
+                    with buffered_output():
+                        result = TESTS[name](rpc)
+                    if result == 0:
+                        passed_count += 1
+                    else:
+                        failed_count += 1
+                except RPCError as e:
+                    print(f"\nERROR: {e}")
+                    error_count += 1
+
+        # Close connection
+        rpc.close()
+
+    except serial.SerialException as e:
+        print(f"\nERROR: Serial port error: {e}")
+        print(f"Make sure {port} is the correct port and the device is connected.")
+        return 1
+    except KeyboardInterrupt:
+        print("\n\nTest interrupted by user.")
+        return 1
+
+    print("\nResults Summary:")
+    print(f"  Passed:  {passed_count}")
+    print(f"  Failed:  {failed_count}")
+    print(f"  Errors:  {error_count}")
+    return 0 if failed_count == 0 and error_count == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -199,7 +199,7 @@ def main():
 
     try:
         log(2, f"Connecting to {port}...")
-        rpc = DCCTesterRPC(port)
+        rpc = DCCTesterRPC(port, use_msgpack=sys_config.use_msgpack)
         log(2, "✓ Connected!\n")
 
         passed_count = 0
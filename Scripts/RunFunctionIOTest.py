@@ -16,6 +16,10 @@ import importlib.util
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Import system configuration
+sys.path.insert(0, script_dir)
+import System
+
 
 def load_function_io_module(file_path, module_name):
     spec = importlib.util.spec_from_file_location(module_name, file_path)
@@ -157,7 +161,7 @@ def main():
     try:
         # Connect to DCC_tester
         log(2, f"Connecting to {port}...")
-        rpc = DCCTesterRPC(port)
+        rpc = DCCTesterRPC(port, use_msgpack=System.get_config().use_msgpack)
         log(2, "✓ Connected!\n")
 
         # Run test iterations
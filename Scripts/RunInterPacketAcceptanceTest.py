@@ -196,7 +196,7 @@ def main():
     try:
         # Connect to DCC_tester
         log(2, f"Connecting to {port}...")
-        rpc = DCCTesterRPC(port)
+        rpc = DCCTesterRPC(port, use_msgpack=sys_config.use_msgpack)
         log(2, "✓ Connected!\n")
         
         # Run test iterations
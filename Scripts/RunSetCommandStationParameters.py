@@ -7,59 +7,11 @@ This script sets command station parameters via RPC.
 Configuration is read from RunSetCommandStationParametersConfig.txt.
 """
 
-import json
 import os
 import sys
-import time
 import serial
 
-
-LOG_LEVEL = 1  # 0 = none, 1 = minimum, 2 = verbose
-
-
-def set_log_level(level):
-    """Set global logging level (0=none, 1=minimum, 2=verbose)."""
-    global LOG_LEVEL
-    try:
-        level_int = int(level)
-    except (TypeError, ValueError):
-        level_int = 1
-    LOG_LEVEL = max(0, min(2, level_int))
-
-
-def log(level, message):
-    if LOG_LEVEL >= level:
-        if LOG_LEVEL == 2:
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-            print(f"[{timestamp}] {message}")
-        else:
-            print(message)
-
-
-class DCCTesterRPC:
-    """RPC client for DCC_tester command station."""
-
-    def __init__(self, port, baudrate=115200, timeout=2):
-        self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        time.sleep(0.5)  # Allow time for connection to establish
-
-    def send_rpc(self, method, params):
-        request = {
-            "method": method,
-            "params": params,
-        }
-        request_json = json.dumps(request) + "\r\n"
-        log(2, f"→ {request_json.strip()}")
-        self.ser.write(request_json.encode("utf-8"))
-
-        response_line = self.ser.readline().decode("utf-8").strip()
-        log(2, f"← {response_line}")
-        if response_line:
-            return json.loads(response_line)
-        return None
-
-    def close(self):
-        self.ser.close()
+from dcc_common import DCCTesterRPC, log, set_log_level
 
 
 def _parse_bool(value, key):
@@ -42,6 +42,7 @@ class SystemConfig:
         self.screenshot_directory = "screenshots"
         self.save_logs = False
         self.log_directory = "logs"
+        self.use_msgpack = False
         self._load_config()
     
     def _parse_bool(self, value):
@@ -88,6 +89,7 @@ class SystemConfig:
             self.screenshot_directory = config.get("screenshot_directory", "screenshots")
             self.save_logs = self._parse_bool(config.get("save_logs", "false"))
             self.log_directory = config.get("log_directory", "logs")
+            self.use_msgpack = self._parse_bool(config.get("use_msgpack", "false"))
             
         except Exception as e:
             print(f"Warning: Error loading config file: {e}")
@@ -105,6 +107,7 @@ class SystemConfig:
         print(f"  Log directory:       {self.log_directory}")
         print(f"  Monitor index:       {self.monitor_index}")
         print(f"  Screenshot dir:      {self.screenshot_directory}")
+        print(f"  Use MessagePack:     {self.use_msgpack}")
         print("=" * 70)
     
     def toggle_logging(self):
@@ -6,7 +6,11 @@ SendEmergencyStop Script
 Sends a single DCC emergency stop packet to a specific address or broadcast (0).
 """
 
+import functools
 import json
+import operator
+
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
 
 
 class DCCTesterRPC:
@@ -37,7 +41,7 @@ class DCCTesterRPC:
 			"params": params
 		}
 
-		request_json = json.dumps(request) + '\r\n'
+		request_json = _encode_json(request) + '\r\n'
 		print(f"→ {request_json.strip()}")
 
 		self.ser.write(request_json.encode('utf-8'))
@@ -60,10 +64,7 @@ def calculate_dcc_checksum(bytes_list):
 	Returns:
 		Checksum byte
 	"""
-	checksum = 0
-	for byte in bytes_list:
-		checksum ^= byte
-	return checksum
+	return functools.reduce(operator.xor, bytes_list, 0)
 
 
 def make_emergency_stop_packet(address):
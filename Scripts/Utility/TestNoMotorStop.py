@@ -14,6 +14,8 @@ If either is low, prints RUN status and returns False.
 
 import json
 
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
 
 class DCCTesterRPC:
 	"""RPC client for DCC_tester command station."""
@@ -43,7 +45,7 @@ class DCCTesterRPC:
 			"params": params
 		}
 
-		request_json = json.dumps(request) + "\r\n"
+		request_json = _encode_json(request) + "\r\n"
 		print(f"→ {request_json.strip()}")
 
 		self.ser.write(request_json.encode("utf-8"))
@@ -263,40 +263,101 @@ VOID usbx_cdc_acm_read_thread_entry(ULONG thread_input)
             rx_index += actual_length;
             buffer_pool[current_buf].data[rx_index] = '\0';
 
-            /* Scan for CRLF terminators */
-            for (uint16_t i = 1; i < rx_index; i++)
+            /* Requests may be JSON lines or binary frames, in any order */
+            UINT binary_next;
+            do
             {
-                if (buffer_pool[current_buf].data[i-1] == '\r' &&
-                    buffer_pool[current_buf].data[i]   == '\n')
+                binary_next = 0;
+
+                /* Binary frames: length header followed by a MessagePack payload */
+                while ((rx_index >= 1) &&
+                       ((UCHAR)buffer_pool[current_buf].data[0] < (RX_BUFFER_SIZE >> 8)))
                 {
-                    /* Strip CRLF */
-                    buffer_pool[current_buf].data[i-1] = '\0';
-                    buffer_pool[current_buf].data[i] = '\0';
+                    char *data = buffer_pool[current_buf].data;
 
-                    /* Length excludes CRLF */
-                    buffer_pool[current_buf].length = i-1;
+                    if (rx_index < RX_FRAME_HEADER_SIZE)
+                    {
+                        break; /* wait for the rest of the header */
+                    }
 
-                    rpc_rxbuffer_t *msg = &buffer_pool[current_buf];
-                    tx_queue_send(&rpc_rxqueue, &msg, TX_NO_WAIT);
+                    ULONG frame_length = ((ULONG)(UCHAR)data[0] << 8) | (UCHAR)data[1];
+                    if ((frame_length == 0) ||
+                        (frame_length + RX_FRAME_HEADER_SIZE > RX_BUFFER_SIZE - 1))
+                    {
+                        rx_index = 0; // drop malformed frame
+                        break;
+                    }
+                    if (rx_index < frame_length + RX_FRAME_HEADER_SIZE)
+                    {
+                        break; /* wait for the rest of the payload */
+                    }
 
-                    /* Switch to next buffer */
-                    current_buf = (current_buf + 1) % RX_POOL_SIZE;
-                    ULONG remaining = rx_index - (i+1);
+                    /* Carry any following request over to the next buffer */
+                    int next_buf = (current_buf + 1) % RX_POOL_SIZE;
+                    ULONG remaining = rx_index - (frame_length + RX_FRAME_HEADER_SIZE);
                     if (remaining > 0)
                     {
-                        memcpy(buffer_pool[current_buf].data,
-                              &buffer_pool[(current_buf-1+RX_POOL_SIZE)%RX_POOL_SIZE].data[i+1],
-                              remaining);
-                        rx_index = remaining;
+                        memcpy(buffer_pool[next_buf].data,
+                               &data[frame_length + RX_FRAME_HEADER_SIZE],
+                               remaining);
                     }
-                    else
+
+                    /* Strip the header */
+                    memmove(data, &data[RX_FRAME_HEADER_SIZE], frame_length);
+                    buffer_pool[current_buf].length = frame_length;
+                    buffer_pool[current_buf].binary = 1;
+
+                    rpc_rxbuffer_t *msg = &buffer_pool[current_buf];
+                    tx_queue_send(&rpc_rxqueue, &msg, TX_NO_WAIT);
+
+                    current_buf = next_buf;
+                    rx_index = remaining;
+                    buffer_pool[current_buf].data[rx_index] = '\0';
+                }
+
+                /* Scan for CRLF terminators */
+                for (uint16_t i = 1; i < rx_index; i++)
+                {
+                    if (buffer_pool[current_buf].data[i-1] == '\r' &&
+                        buffer_pool[current_buf].data[i]   == '\n')
                     {
-                        rx_index = 0;
+                        /* Strip CRLF */
+                        buffer_pool[current_buf].data[i-1] = '\0';
+                        buffer_pool[current_buf].data[i] = '\0';
+
+                        /* Length excludes CRLF */
+                        buffer_pool[current_buf].length = i-1;
+                        buffer_pool[current_buf].binary = 0;
+
+                        rpc_rxbuffer_t *msg = &buffer_pool[current_buf];
+                        tx_queue_send(&rpc_rxqueue, &msg, TX_NO_WAIT);
+
+                        /* Switch to next buffer */
+                        current_buf = (current_buf + 1) % RX_POOL_SIZE;
+                        ULONG remaining = rx_index - (i+1);
+                        if (remaining > 0)
+                        {
+                            memcpy(buffer_pool[current_buf].data,
+                                  &buffer_pool[(current_buf-1+RX_POOL_SIZE)%RX_POOL_SIZE].data[i+1],
+                                  remaining);
+                            rx_index = remaining;
+                        }
+                        else
+                        {
+                            rx_index = 0;
+                        }
+
+                        if ((rx_index > 0) &&
+                            ((UCHAR)buffer_pool[current_buf].data[0] < (RX_BUFFER_SIZE >> 8)))
+                        {
+                            binary_next = 1; /* binary frame follows */
+                            break;
+                        }
+
+                        i = 0; // restart scan
                     }
-
-                    i = 0; // restart scan
                 }
-            }
+            } while (binary_next);
 
             if (rx_index >= RX_BUFFER_SIZE-1)
             {